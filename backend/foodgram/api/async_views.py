@@ -0,0 +1,148 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+from foodgram.db import close_unusable_connections
+
+# Горячие маршруты чтения, которые в режиме ASGI обслуживаются
+# асинхронными представлениями.
+ASYNC_ROUTES = frozenset((
+    'recipes-list',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+    'recipes-feed',
+    'tags-list',
+    'tags-detail',
+    'ingredients-list',
+    'ingredients-detail',
+))
+
+# Отдельный ограниченный пул: у каждого потока своё соединение с базой,
+# так что размер пула — это и число соединений на воркер.
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_VIEW_THREADS,
+                              thread_name_prefix='async-view')
+
+# Сколько кусков потокового ответа рабочий поток читает впрок,
+# пока цикл событий их не отправил, и как часто он проверяет,
+# не оборвался ли ответ.
+STREAM_BUFFER_CHUNKS = 16
+STREAM_POLL_INTERVAL = 0.5
+
+_END = object()
+
+
+async def iterate_in_thread(content):
+    """Асинхронный итератор по телу потокового ответа.
+
+    Тело перебирается целиком в одном потоке пула: курсор базы
+    привязан к потоку, а в цикле событий обращаться к базе нельзя.
+    Поток читает не больше STREAM_BUFFER_CHUNKS кусков впрок, так что
+    ответ не собирается в памяти целиком."""
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(STREAM_BUFFER_CHUNKS)
+    stopped = threading.Event()
+
+    def produce():
+        try:
+            for chunk in content:
+                while not slots.acquire(timeout=STREAM_POLL_INTERVAL):
+                    if stopped.is_set():
+                        return
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        finally:
+            close_old_connections()
+            loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+    task = asyncio.ensure_future(sync_to_async(
+        produce, thread_sensitive=False, executor=executor)())
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is _END:
+                break
+            slots.release()
+            yield chunk
+        await task
+    finally:
+        stopped.set()
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI-обработчик, который перебирает тело потокового ответа
+    через iterate_in_thread. Обработчик Django 3.2 делает это прямо
+    в цикле событий, и запросы к базе из генератора тела падают."""
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+        headers = [
+            (header.encode('ascii'), value.encode('latin1'))
+            for header, value in response.items()
+        ]
+        headers.extend(
+            (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            for cookie in response.cookies.values()
+        )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': headers,
+        })
+        async for part in iterate_in_thread(response):
+            for chunk, _ in self.chunk_bytes(part):
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+        await send({'type': 'http.response.body'})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def async_view(view):
+    """Асинхронная обёртка синхронного представления DRF.
+
+    ORM Django 3.2 синхронный, поэтому работа представления идёт
+    в пуле потоков (размер задаёт ASYNC_VIEW_THREADS), а цикл событий
+    свободен для других запросов. Соединения с базой в рабочих
+    потоках обслуживаются так же, как в синхронном запросе. Тело
+    потокового ответа читается позже, в StreamingASGIHandler."""
+
+    def run(request, *args, **kwargs):
+        close_unusable_connections()
+        close_old_connections()
+        try:
+            response = view(request, *args, **kwargs)
+            if not getattr(response, 'is_rendered', True):
+                response.render()
+            return response
+        finally:
+            close_old_connections()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await sync_to_async(
+            run, thread_sensitive=False, executor=executor,
+        )(request, *args, **kwargs)
+
+    return wrapper
+
+
+def make_async_urls(urlpatterns, names=ASYNC_ROUTES):
+    """Копия urlpatterns, в которой маршруты с именами names
+    обслуживаются асинхронными обёртками."""
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in names
+        else pattern
+        for pattern in urlpatterns
+    ]
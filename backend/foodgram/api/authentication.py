@@ -0,0 +1,150 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+CACHE_PREFIX = 'auth:token'
+# Хэш пароля в снимок не попадает: при обращении к нему поле
+# подгрузится из базы отдельным запросом.
+EXCLUDED_FIELDS = frozenset(('password',))
+
+
+def _shared_key(key):
+    # Сам токен не используется как ключ кэша, чтобы не светить его
+    # в общем хранилище.
+    return '{}:{}'.format(
+        CACHE_PREFIX, hashlib.sha256(key.encode()).hexdigest())
+
+
+class TokenCache:
+    """LRU-кэш снимков «токен → пользователь» в памяти процесса.
+
+    Записи живут не дольше ttl секунд и вытесняются по размеру.
+    Счётчик поколений не даёт запросу, прочитавшему пользователя
+    до инвалидации, положить в кэш устаревший снимок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    @property
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, snapshot = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return snapshot
+
+    def set(self, key, snapshot, generation):
+        ttl = settings.AUTH_TOKEN_CACHE_TTL
+        size = settings.AUTH_TOKEN_CACHE_SIZE
+        if ttl <= 0 or size <= 0:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def delete(self, keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def make_snapshot(token):
+    user = token.user
+    fields = [field.attname for field in User._meta.concrete_fields
+              if field.attname not in EXCLUDED_FIELDS]
+    return {
+        'db': user._state.db,
+        'fields': fields,
+        'values': [getattr(user, name) for name in fields],
+        'created': token.created,
+    }
+
+
+def restore_snapshot(key, snapshot):
+    """Новые экземпляры на каждый запрос: представления могут менять
+    request.user, и эти изменения не должны попасть в кэш."""
+    user = User.from_db(
+        snapshot['db'], snapshot['fields'], snapshot['values'])
+    token = Token(key=key, user_id=user.pk, created=snapshot['created'])
+    token.user = user
+    return user, token
+
+
+def invalidate_tokens(keys):
+    """Удаляет снимки токенов keys из кэша процесса и общего кэша.
+
+    Другие процессы сбрасывают свои копии только по истечении
+    AUTH_TOKEN_CACHE_TTL, поэтому при нескольких воркерах время
+    жизни записи стоит держать коротким.
+    """
+    keys = list(keys)
+    if not keys:
+        return
+    token_cache.delete(keys)
+    if settings.AUTH_TOKEN_SHARED_CACHE:
+        cache.delete_many([_shared_key(key) for key in keys])
+
+
+def invalidate_user_tokens(user_id):
+    invalidate_tokens(Token.objects.filter(
+        user_id=user_id).values_list('key', flat=True))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которая в обычном случае не обращается
+    к базе: снимок пользователя берётся из LRU-кэша процесса, а при
+    AUTH_TOKEN_SHARED_CACHE — ещё и из общего кэша. Снимки сбрасываются
+    сигналами при удалении токена (выход) и сохранении пользователя
+    (смена пароля, деактивация, правка профиля)."""
+
+    def authenticate_credentials(self, key):
+        snapshot = token_cache.get(key)
+        if snapshot is None and settings.AUTH_TOKEN_SHARED_CACHE:
+            generation = token_cache.generation
+            snapshot = cache.get(_shared_key(key))
+            if snapshot is not None:
+                token_cache.set(key, snapshot, generation)
+        if snapshot is not None:
+            return restore_snapshot(key, snapshot)
+        generation = token_cache.generation
+        user, token = super().authenticate_credentials(key)
+        snapshot = make_snapshot(token)
+        token_cache.set(key, snapshot, generation)
+        if (settings.AUTH_TOKEN_SHARED_CACHE
+                and generation == token_cache.generation):
+            cache.set(_shared_key(key), snapshot,
+                      settings.AUTH_TOKEN_SHARED_CACHE_TTL)
+        return user, token
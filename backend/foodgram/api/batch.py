@@ -0,0 +1,72 @@
+from django.db import transaction
+
+from posts.counters import count_ids
+from posts.utils import bulk_delete, bulk_insert_or_ignore
+from .serializers import BatchSerializer
+
+ADDED = 'added'
+EXISTS = 'exists'
+NOT_FOUND = 'not_found'
+REMOVED = 'removed'
+MISSING = 'missing'
+SELF = 'self'
+
+
+def get_batch_ids(request):
+    """Список id из тела пакетного запроса {"ids": [...]}."""
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def unique_ids(ids):
+    """id без повторов, в порядке первого появления."""
+    return list(dict.fromkeys(ids))
+
+
+@transaction.atomic
+def batch_add(user, model, field, target_model, ids, on_added=None,
+              rejected=()):
+    """Добавляет связи user -> field для всех ids: одна проверка
+    существования, один INSERT и по UPDATE на каждый затронутый
+    счётчик. Возвращает (результаты, id добавленных). on_added получает
+    множество добавленных id в той же транзакции. id из rejected
+    не добавляются и получают статус self."""
+    ids = unique_ids(ids)
+    rejected = set(rejected)
+    found = set(target_model.objects.filter(
+        pk__in=[target_id for target_id in ids
+                if target_id not in rejected]).values_list('pk', flat=True))
+    created = bulk_insert_or_ignore(model, [
+        {'user_id': user.id, f'{field}_id': target_id}
+        for target_id in ids if target_id in found
+    ])
+    added = {getattr(instance, f'{field}_id') for instance in created}
+    count_ids(model, field, added, 1)
+    if added and on_added is not None:
+        on_added(added)
+    return [
+        {'id': target_id,
+         'status': (SELF if target_id in rejected
+                    else NOT_FOUND if target_id not in found
+                    else ADDED if target_id in added else EXISTS)}
+        for target_id in ids
+    ], added
+
+
+@transaction.atomic
+def batch_remove(user, model, field, ids, on_removed=None):
+    """Удаляет связи user -> field для всех ids одним DELETE
+    и обновляет счётчики. Возвращает (результаты, id удалённых)."""
+    ids = unique_ids(ids)
+    removed = bulk_delete(
+        model.objects.filter(user=user, **{f'{field}_id__in': ids}),
+        f'{field}_id')
+    count_ids(model, field, removed, -1)
+    if removed and on_removed is not None:
+        on_removed(removed)
+    return [
+        {'id': target_id,
+         'status': REMOVED if target_id in removed else MISSING}
+        for target_id in ids
+    ], removed
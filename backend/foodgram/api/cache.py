@@ -0,0 +1,125 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from foodgram.db import pin_to_primary
+from posts.models import Tag
+
+CACHE_PREFIX = 'recipes'
+BASE_GENERATION = 'base'
+ALL_GENERATION = 'all'
+
+
+def tag_generation(slug):
+    return f'tag:{slug}'
+
+
+def author_generation(author_id):
+    return f'author:{author_id}'
+
+
+def recipe_generation(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def _generation_key(name):
+    return f'{CACHE_PREFIX}:generation:{name}'
+
+
+def get_generations(names):
+    """Текущие значения счётчиков поколений. Отсутствующий в кэше
+    счётчик получает новое значение по времени, чтобы не совпасть
+    с одним из прежних."""
+    keys = [_generation_key(name) for name in names]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def bump_generations(names):
+    """Инвалидирует все ответы, зависящие от счётчиков names, за O(1)
+    на счётчик, без перебора ключей."""
+    for name in set(names):
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def bump_recipe_generations(recipe, tag_slugs=None):
+    """Сбрасывает кэш списков и карточки рецепта."""
+    if tag_slugs is None:
+        tag_slugs = Tag.objects.filter(
+            recipe=recipe).values_list('slug', flat=True)
+    bump_generations([
+        ALL_GENERATION,
+        author_generation(recipe.author_id),
+        recipe_generation(recipe.pk),
+        *(tag_generation(slug) for slug in tag_slugs),
+    ])
+
+
+def _normalized_query(request):
+    return urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+
+
+def is_cacheable(request):
+    return (request.method in SAFE_METHODS
+            and not request.user.is_authenticated)
+
+
+def get_list_generations(request):
+    names = [BASE_GENERATION]
+    tags = request.query_params.getlist('tags')
+    author = request.query_params.get('author')
+    names.extend(tag_generation(slug) for slug in sorted(set(tags)))
+    if author:
+        names.append(author_generation(author))
+    if not tags and not author:
+        names.append(ALL_GENERATION)
+    return names
+
+
+def get_detail_generations(recipe_id):
+    return [BASE_GENERATION, recipe_generation(recipe_id)]
+
+
+def cached_response(request, generation_names, build_response,
+                    version=None):
+    """Отдаёт данные ответа анонимному пользователю из кэша или строит
+    их через build_response и кладёт в кэш под ключом, включающим
+    текущие поколения и version — валидатор, прочитанный из базы:
+    поколения в кэше процесса не видят изменений из других процессов."""
+    if not is_cacheable(request):
+        return build_response()
+    raw_key = ':'.join([
+        request.get_host(),
+        request.path,
+        _normalized_query(request),
+        *map(str, get_generations(generation_names)),
+        str(version),
+    ])
+    key = '{}:response:{}'.format(
+        CACHE_PREFIX, hashlib.md5(raw_key.encode()).hexdigest())
+    data = cache.get(key)
+    if data is not None:
+        return Response(data)
+    # Отстающая реплика не должна попасть в кэш под новым поколением.
+    pin_to_primary()
+    response = build_response()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.RECIPE_CACHE_TIMEOUT)
+    return response
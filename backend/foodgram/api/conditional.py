@@ -0,0 +1,48 @@
+import hashlib
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    return '"{}"'.format(
+        hashlib.md5(':'.join(map(str, parts)).encode()).hexdigest())
+
+
+def get_collection_state(queryset):
+    """Число строк и время последнего изменения справочника."""
+    state = queryset.aggregate(count=Count('id'), last_modified=Max('updated'))
+    return state['count'], state['last_modified']
+
+
+def related_aggregate(queryset, fk, aggregate):
+    """Подзапрос с агрегатом по строкам queryset, которые ссылаются
+    через fk на объект внешнего запроса."""
+    return Subquery(queryset.filter(**{fk: OuterRef('pk')}).order_by()
+                    .values(fk).annotate(value=aggregate).values('value'))
+
+
+def get_collection_validators(request, state):
+    """ETag и Last-Modified справочника по его состоянию: один
+    агрегирующий запрос вместо сериализации."""
+    count, last_modified = state
+    return (
+        make_etag(request.get_full_path(), count, last_modified),
+        int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def conditional_response(request, etag, last_modified, build_response):
+    """Отвечает 304 по If-None-Match / If-Modified-Since до построения
+    тела; иначе строит ответ и добавляет к нему валидаторы."""
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+    response = build_response()
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from posts.models import Recipe, Subscribe
+
+
+def get_join_feed_ids(author_ids, before_id, limit):
+    """Один запрос с IN по всем авторам. Хорош, пока авторов мало:
+    база читает все их рецепты новее курсора и сортирует."""
+    recipes = Recipe.objects.filter(author_id__in=author_ids)
+    if before_id is not None:
+        recipes = recipes.filter(pk__lt=before_id)
+    return list(recipes.order_by('-id').values_list('id', flat=True)[:limit])
+
+
+def get_merge_feed_ids(user, before_id, limit):
+    """Ограниченное k-путевое слияние по индексу (author_id, -id).
+
+    Сначала один запрос берёт для каждой подписки самый новый рецепт
+    автора старше курсора: по одному спуску по индексу на автора.
+    Страницу могут дать только limit авторов с самыми новыми такими
+    рецептами, а все её рецепты не старше limit-го из них, поэтому
+    второй запрос читает диапазоны индекса только этих авторов.
+    Объём работы не зависит от длины истории авторов.
+    """
+    heads = Recipe.objects.filter(author_id=OuterRef('author_id'))
+    if before_id is not None:
+        heads = heads.filter(pk__lt=before_id)
+    rows = Subscribe.objects.filter(user=user).annotate(
+        head_id=Subquery(heads.order_by('-id').values('id')[:1]),
+    ).order_by().values_list('author_id', 'head_id')
+    top = sorted((row for row in rows if row[1] is not None),
+                 key=lambda row: row[1], reverse=True)[:limit]
+    if not top:
+        return []
+    recipes = Recipe.objects.filter(
+        author_id__in=[author_id for author_id, _ in top])
+    if len(top) == limit:
+        recipes = recipes.filter(pk__gte=top[-1][1])
+    if before_id is not None:
+        recipes = recipes.filter(pk__lt=before_id)
+    return list(recipes.order_by('-id').values_list('id', flat=True)[:limit])
+
+
+def get_feed_ids(user, before_id, limit):
+    """id до limit рецептов авторов, на которых подписан user, старше
+    before_id, от новых к старым. План выбирается по числу подписок:
+    до FEED_MERGE_MIN_AUTHORS — соединение, больше — слияние."""
+    author_ids = list(Subscribe.objects.filter(
+        user=user).values_list('author_id', flat=True)[
+            :settings.FEED_MERGE_MIN_AUTHORS + 1])
+    if not author_ids:
+        return []
+    if len(author_ids) <= settings.FEED_MERGE_MIN_AUTHORS:
+        return get_join_feed_ids(author_ids, before_id, limit)
+    return get_merge_feed_ids(user, before_id, limit)
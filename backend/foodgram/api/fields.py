@@ -0,0 +1,78 @@
+import hashlib
+import threading
+from concurrent import futures
+
+from django.conf import settings
+from django.urls import reverse
+from drf_extra_fields.fields import Base64ImageField
+from rest_framework import serializers
+
+from .thumbnails import THUMBNAIL_FORMATS
+
+_decode_executor = futures.ThreadPoolExecutor(
+    max_workers=settings.IMAGE_DECODE_WORKERS,
+    thread_name_prefix='image-decode',
+)
+_decode_slots = threading.BoundedSemaphore(settings.IMAGE_DECODE_WORKERS * 2)
+
+
+class HashedBase64ImageField(Base64ImageField):
+    """Картинка в Base64 с именем файла по SHA-256 содержимого.
+
+    Декодирование и проверка изображения выполняются в ограниченном
+    пуле потоков: одновременно в памяти не больше
+    2 * IMAGE_DECODE_WORKERS декодированных файлов. Слишком большие
+    строки отклоняются до декодирования.
+    """
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+        'busy': 'Сервер перегружен, повторите загрузку изображения позже.',
+    }
+
+    def get_file_name(self, decoded_file):
+        return hashlib.sha256(decoded_file).hexdigest()
+
+    def to_internal_value(self, base64_data):
+        max_size = settings.IMAGE_MAX_SIZE
+        if isinstance(base64_data, str):
+            encoded = base64_data.split(';base64,')[-1]
+            if len(encoded) > (max_size + 2) // 3 * 4:
+                self.fail('too_large', max_size=max_size)
+        if not _decode_slots.acquire(timeout=settings.IMAGE_DECODE_TIMEOUT):
+            self.fail('busy')
+        try:
+            future = _decode_executor.submit(
+                super().to_internal_value, base64_data)
+        except BaseException:
+            _decode_slots.release()
+            raise
+        # Слот освобождается, когда декодирование действительно
+        # закончилось, а не когда запрос перестал его ждать.
+        future.add_done_callback(lambda _: _decode_slots.release())
+        try:
+            return future.result(timeout=settings.IMAGE_DECODE_TIMEOUT)
+        except futures.TimeoutError:
+            future.cancel()
+            self.fail('busy')
+
+
+class ThumbnailsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки:
+    {размер: {формат: url}}."""
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        thumbnails = {}
+        for size in settings.THUMBNAIL_SIZES:
+            thumbnails[size] = {}
+            for image_format in THUMBNAIL_FORMATS:
+                url = reverse('thumbnail', kwargs={
+                    'size': size,
+                    'image_format': image_format,
+                    'source': value.name,
+                })
+                thumbnails[size][image_format] = (
+                    request.build_absolute_uri(url) if request else url)
+        return thumbnails
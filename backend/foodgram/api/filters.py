@@ -1,10 +1,16 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
 from django_filters.rest_framework import FilterSet, filters
 
 from posts.models import Ingredient, Recipe, Tag
 
 User = get_user_model()
 
+ORDERING_POPULAR = 'popular'
+POPULAR_ORDERING = ('-popularity', '-id')
+
 
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr='istartswith')
@@ -29,10 +35,18 @@ class RecipesFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart',
     )
+    search = filters.CharFilter(
+        method='get_search',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=((ORDERING_POPULAR, 'По популярности'),),
+        method='get_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ['is_favorited', 'author', 'tags', 'is_in_shopping_cart']
+        fields = ['is_favorited', 'author', 'tags', 'is_in_shopping_cart',
+                  'search', 'ordering']
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -45,3 +59,34 @@ class RecipesFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(recipe_shopping_cart__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию с сортировкой
+        по релевантности. На PostgreSQL использует search_vector
+        с GIN-индексом, на остальных базах — поиск подстроки.
+        Явный ordering=popular применяется после и важнее релевантности;
+        курсорный режим без него поиск отклоняет (RecipePagination)."""
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor == 'postgresql':
+            query = SearchQuery(value, config='russian',
+                                search_type='websearch')
+            queryset = queryset.filter(search_vector=query).annotate(
+                search_rank=SearchRank(F('search_vector'), query))
+        else:
+            queryset = queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            ).annotate(search_rank=Case(
+                When(name__icontains=value, then=Value(1.0)),
+                default=Value(0.4),
+                output_field=FloatField(),
+            ))
+        return queryset.order_by('-search_rank', *Recipe._meta.ordering)
+
+    def get_ordering(self, queryset, name, value):
+        """ordering=popular: по рейтингу, который пересчитывает
+        update_popularity, по индексу (-popularity, -id)."""
+        if value == ORDERING_POPULAR:
+            return queryset.order_by(*POPULAR_ORDERING)
+        return queryset
@@ -0,0 +1,70 @@
+import threading
+from bisect import bisect_left
+
+from posts.models import Ingredient
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Строится лениво при первом обращении: список отсортирован по
+    названию в нижнем регистре, поиск по префиксу выполняется бинарным
+    поиском без обращения к базе. Сбрасывается сигналами при изменении
+    ингредиентов и при смене версии справочника, переданной в search:
+    так в индекс попадают изменения из других процессов и bulk-операций
+    без сигналов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._keys = None
+        self._items = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._keys = None
+            self._items = None
+
+    def _load(self):
+        with self._lock:
+            if self._keys is not None:
+                return self._keys, self._items
+            generation = self._generation
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit')
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        with self._lock:
+            if self._generation == generation:
+                self._keys = keys
+                self._items = items
+        return keys, items
+
+    def search(self, prefix='', limit=None, version=None):
+        """Ингредиенты, название которых начинается с prefix
+        (без учёта регистра), в алфавитном порядке."""
+        if version is not None and version != self._version:
+            self.invalidate()
+            self._version = version
+        keys, items = self._load()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        result = []
+        for position in range(start, stop):
+            if not keys[position].startswith(prefix):
+                break
+            result.append(items[position])
+        return result
+
+
+ingredient_index = IngredientIndex()
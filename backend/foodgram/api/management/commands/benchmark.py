@@ -0,0 +1,207 @@
+import json
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import (Favorite, Ingredient, Recipe, ShoppingCard,
+                          Subscribe, Tag)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+}
+
+
+def percentile(values, fraction):
+    """Перцентиль с линейной интерполяцией по отсортированным values."""
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число SQL-запросов ключевых эндпоинтов '
+            'через тестовый клиент Django; результат пишет в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--user',
+            help='Имя пользователя для авторизованных запросов; по '
+                 'умолчанию — пользователь с самой большой корзиной.')
+        parser.add_argument(
+            '--cache', action='store_true',
+            help='Не отключать кэш ответов (по умолчанию замеряется '
+                 'путь через базу).')
+        parser.add_argument('--only', nargs='+', metavar='NAME',
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Сравнить с результатами предыдущего запуска.')
+
+    def handle(self, *args, **options):
+        if not Recipe.objects.exists():
+            raise CommandError('Рецептов нет; сначала запустите seed_data.')
+        self.rng = random.Random(options['seed'])
+        user = self.get_user(options['user'])
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.
+                           get_or_create(user=user)[0].key)
+        scenarios = self.get_scenarios(user)
+        if options['only']:
+            unknown = set(options['only']) - set(scenarios)
+            if unknown:
+                raise CommandError(
+                    f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+            scenarios = {name: urls for name, urls in scenarios.items()
+                         if name in options['only']}
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS,
+                                       'testserver']}
+        if not options['cache']:
+            overrides['CACHES'] = NO_CACHE
+        with override_settings(**overrides):
+            results = {
+                name: self.measure(client, urls, options['iterations'],
+                                   options['warmup'])
+                for name, urls in scenarios.items()
+            }
+        report = {
+            'meta': {
+                'timestamp': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'cache': options['cache'],
+                'user': user.username,
+                'rows': {
+                    model.__name__: model.objects.count()
+                    for model in (User, Recipe, Tag, Ingredient, Favorite,
+                                  ShoppingCard, Subscribe)
+                },
+            },
+            'results': results,
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        self.print_report(results, previous)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            logger.info(f'Результаты замеров записаны в {options["output"]}')
+
+    def get_user(self, username):
+        if username:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                raise CommandError(f'Пользователь {username} не найден.')
+            return user
+        return User.objects.annotate(
+            cart_size=Count('shopping_cart'),
+        ).order_by('-cart_size', 'id').first()
+
+    def get_scenarios(self, user):
+        """Сценарий — список адресов, по которым ходят по кругу."""
+        recipe_ids = list(Recipe.objects.order_by('id').values_list(
+            'id', flat=True))
+        recipe_ids = self.rng.sample(recipe_ids, min(len(recipe_ids), 200))
+        # Без параметра tags список рецептов пуст: фронтенд всегда
+        # передаёт выбранные теги.
+        all_tags = '&'.join(
+            f'tags={slug}' for slug in Tag.objects.values_list(
+                'slug', flat=True))
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        author_id = Recipe.objects.values('author_id').annotate(
+            total=Count('id')).order_by('-total').values_list(
+            'author_id', flat=True).first()
+        name = Ingredient.objects.order_by('id').values_list(
+            'name', flat=True).first() or ''
+        word = Recipe.objects.order_by('id').values_list(
+            'name', flat=True).first().split()[0]
+        return {
+            'recipes-list': [f'/api/recipes/?page=1&{all_tags}'],
+            'recipes-list-deep-page': [f'/api/recipes/?page=50&{all_tags}'],
+            'recipes-list-cursor': [
+                f'/api/recipes/?pagination=cursor&{all_tags}'],
+            'recipes-list-tag': [f'/api/recipes/?tags={tag}'],
+            'recipes-list-author': [
+                f'/api/recipes/?author={author_id}&{all_tags}'],
+            'recipes-list-favorited': [
+                f'/api/recipes/?is_favorited=1&{all_tags}'],
+            'recipes-list-search': [
+                f'/api/recipes/?search={word}&{all_tags}'],
+            'recipes-detail': [f'/api/recipes/{recipe_id}/'
+                               for recipe_id in recipe_ids],
+            'subscriptions': ['/api/users/subscriptions/?recipes_limit=3'],
+            'download-shopping-cart': [
+                '/api/recipes/download_shopping_cart/'],
+            'ingredient-search': [f'/api/ingredients/?name={name[:i]}'
+                                  for i in range(1, min(len(name), 4) + 1)],
+        }
+
+    def measure(self, client, urls, iterations, warmup):
+        for index in range(warmup):
+            self.request(client, urls[index % len(urls)])
+        timings, queries, statuses = [], [], set()
+        for index in range(iterations):
+            url = urls[index % len(urls)]
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                status = self.request(client, url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(context.captured_queries))
+            statuses.add(status)
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 0.5), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'mean_ms': round(sum(timings) / len(timings), 3),
+            'queries': max(queries),
+            'statuses': sorted(statuses),
+        }
+
+    @staticmethod
+    def request(client, url):
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+        return response.status_code
+
+    def print_report(self, results, previous=None):
+        header = (f'{"сценарий":<26}{"p50":>9}{"p95":>9}{"p99":>9}'
+                  f'{"SQL":>6}')
+        if previous:
+            header += f'{"Δp95":>9}{"ΔSQL":>6}'
+        self.stdout.write(header)
+        for name, result in results.items():
+            line = (f'{name:<26}{result["p50_ms"]:>9.2f}'
+                    f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+                    f'{result["queries"]:>6}')
+            before = (previous or {}).get(name)
+            if before:
+                change = (result['p95_ms'] / before['p95_ms'] - 1) * 100
+                line += (f'{change:>+8.0f}%'
+                         f'{result["queries"] - before["queries"]:>+6}')
+            self.stdout.write(line)
@@ -0,0 +1,158 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from api.async_views import iterate_in_thread
+from posts.models import Recipe, ShoppingCard
+from .benchmark import NO_CACHE, percentile
+
+# Задержка, которую получает первый SQL-запрос «медленного» запроса.
+_slow_delay = ContextVar('benchmark_slow_delay', default=None)
+
+
+def delay_query(execute, sql, params, many, context):
+    delay = _slow_delay.get()
+    if delay and delay['pending']:
+        delay['pending'] = False
+        time.sleep(delay['seconds'])
+    return execute(sql, params, many, context)
+
+
+def install_delay(sender, connection, **kwargs):
+    if delay_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(delay_query)
+
+
+class Command(BaseCommand):
+    help = ('Смешанная нагрузка: медленные выгрузки списка покупок '
+            'и быстрые чтения одновременно. В режиме wsgi запросы идут '
+            'через пул синхронных воркеров, в режиме asgi — через '
+            'ASGI-приложение; режим берётся из SERVER_MODE. Выгрузки '
+            'приходят разом, быстрые запросы — равномерно с частотой '
+            '--rate; время ответа считается от момента отправки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--slow', type=int, default=4,
+                            help='Число медленных выгрузок.')
+        parser.add_argument('--slow-delay', type=float, default=0.5,
+                            help='Искусственная задержка выгрузки, с.')
+        parser.add_argument('--fast', type=int, default=40,
+                            help='Число быстрых запросов.')
+        parser.add_argument('--rate', type=float, default=20,
+                            help='Быстрых запросов в секунду.')
+        parser.add_argument(
+            '--workers', type=int, default=2,
+            help='Синхронных воркеров в режиме wsgi (как у gunicorn).')
+        parser.add_argument('--output', help='Файл для результатов JSON.')
+
+    def handle(self, *args, **options):
+        cart = ShoppingCard.objects.select_related('user').first()
+        recipe = Recipe.objects.first()
+        if cart is None or recipe is None:
+            raise CommandError('Нет данных; сначала запустите seed_data.')
+        self.token = Token.objects.get_or_create(user=cart.user)[0].key
+        self.slow_url = '/api/recipes/download_shopping_cart/'
+        self.fast_urls = ['/api/tags/', f'/api/recipes/{recipe.id}/']
+        self.options = options
+        connection_created.connect(install_delay)
+        for connection in connections.all():
+            install_delay(None, connection)
+        mode = settings.SERVER_MODE
+        with override_settings(CACHES=NO_CACHE, ALLOWED_HOSTS=[
+                *settings.ALLOWED_HOSTS, 'testserver']):
+            start = time.perf_counter()
+            if mode == 'asgi':
+                slow, fast = asyncio.run(self.run_asgi())
+            else:
+                slow, fast = self.run_wsgi()
+            total = time.perf_counter() - start
+        slow.sort()
+        fast.sort()
+        report = {
+            'mode': mode,
+            'workers': (options['workers'] if mode != 'asgi'
+                        else settings.ASYNC_VIEW_THREADS),
+            'slow': options['slow'],
+            'slow_delay': options['slow_delay'],
+            'fast': options['fast'],
+            'rate': options['rate'],
+            'total_s': round(total, 3),
+            'fast_p50_ms': round(percentile(fast, 0.5) * 1000, 1),
+            'fast_p95_ms': round(percentile(fast, 0.95) * 1000, 1),
+            'fast_p99_ms': round(percentile(fast, 0.99) * 1000, 1),
+            'slow_p50_ms': (round(percentile(slow, 0.5) * 1000, 1)
+                            if slow else None),
+        }
+        for key, value in report.items():
+            self.stdout.write(f'{key:<14}{value}')
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def requests(self):
+        """(адрес, медленный ли, время отправки от начала замера)."""
+        yield from ((self.slow_url, True, 0.0)
+                    for _ in range(self.options['slow']))
+        yield from ((self.fast_urls[index % len(self.fast_urls)], False,
+                     index / self.options['rate'])
+                    for index in range(self.options['fast']))
+
+    def slow_delay(self, is_slow):
+        if not is_slow:
+            return None
+        return {'pending': True, 'seconds': self.options['slow_delay']}
+
+    @staticmethod
+    def split(results):
+        results = list(results)
+        return ([latency for is_slow, latency in results if is_slow],
+                [latency for is_slow, latency in results if not is_slow])
+
+    def run_wsgi(self):
+        started = time.perf_counter()
+
+        def call(url, is_slow, send_at):
+            token = _slow_delay.set(self.slow_delay(is_slow))
+            try:
+                response = Client().get(
+                    url, HTTP_AUTHORIZATION=f'Token {self.token}')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            finally:
+                _slow_delay.reset(token)
+            return is_slow, time.perf_counter() - started - send_at
+
+        futures = []
+        with ThreadPoolExecutor(self.options['workers']) as pool:
+            for url, is_slow, send_at in self.requests():
+                time.sleep(max(0.0, started + send_at - time.perf_counter()))
+                futures.append(pool.submit(call, url, is_slow, send_at))
+        return self.split(future.result() for future in futures)
+
+    async def run_asgi(self):
+        client = AsyncClient()
+        started = time.perf_counter()
+
+        async def call(url, is_slow, send_at):
+            await asyncio.sleep(
+                max(0.0, started + send_at - time.perf_counter()))
+            _slow_delay.set(self.slow_delay(is_slow))
+            response = await client.get(
+                url, authorization=f'Token {self.token}')
+            if response.streaming:
+                async for _ in iterate_in_thread(response.streaming_content):
+                    pass
+            return is_slow, time.perf_counter() - started - send_at
+
+        return self.split(await asyncio.gather(*(
+            call(*request) for request in self.requests())))
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Время обработки запроса', DURATION_BUCKETS),
+    'foodgram_request_sql_queries': (
+        'Число SQL-запросов на HTTP-запрос', QUERY_COUNT_BUCKETS),
+    'foodgram_request_sql_duration_seconds': (
+        'Суммарное время SQL-запросов на HTTP-запрос', DURATION_BUCKETS),
+    'foodgram_response_size_bytes': (
+        'Размер тела ответа', SIZE_BUCKETS),
+}
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histograms:
+    """Гистограммы с фиксированными границами в памяти процесса.
+
+    Состояние: {(метрика, маршрут, метод): [счётчики корзин..., сумма]};
+    последняя корзина — +Inf, так что число наблюдений — сумма счётчиков.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def observe(self, route, method, values):
+        """values: {метрика: значение} для одного запроса."""
+        with self._lock:
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                row = self._state.get((name, route, method))
+                if row is None:
+                    row = self._state[(name, route, method)] = (
+                        [0] * (len(buckets) + 1) + [0.0])
+                row[bisect_left(buckets, value)] += 1
+                row[-1] += value
+
+    def snapshot(self):
+        with self._lock:
+            return {key: list(row) for key, row in self._state.items()}
+
+
+class FileHistograms(Histograms):
+    """Вариант для нескольких процессов gunicorn: каждый процесс
+    периодически сбрасывает своё состояние в отдельный файл каталога,
+    а при выдаче метрик файлы всех процессов складываются."""
+
+    flush_interval = 1.0
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        self._flushed_at = 0.0
+        self._flush_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+
+    def observe(self, route, method, values):
+        super().observe(route, method, values)
+        # Файл пишет один поток; остальные не ждут его, а пропускают
+        # сброс: их наблюдения попадут в следующий.
+        if (time.monotonic() - self._flushed_at >= self.flush_interval
+                and self._flush_lock.acquire(blocking=False)):
+            try:
+                self._write()
+            finally:
+                self._flush_lock.release()
+
+    def flush(self):
+        with self._flush_lock:
+            self._write()
+
+    def _write(self):
+        self._flushed_at = time.monotonic()
+        rows = [[*key, row] for key, row in super().snapshot().items()]
+        tmp_path = f'{self.path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w') as file:
+                json.dump(rows, file)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def snapshot(self):
+        self.flush()
+        merged = {}
+        for name in os.listdir(self.directory):
+            if not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as file:
+                    rows = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for metric, route, method, row in rows:
+                if metric not in HISTOGRAMS:
+                    continue
+                total = merged.get((metric, route, method))
+                if total is None:
+                    merged[(metric, route, method)] = row
+                else:
+                    merged[(metric, route, method)] = [
+                        a + b for a, b in zip(total, row)]
+        return merged
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _format_bound(bound):
+    return repr(float(bound))
+
+
+def render(snapshot):
+    """Текстовый формат экспозиции Prometheus."""
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, route, method), row in sorted(snapshot.items()):
+            if metric != name:
+                continue
+            labels = f'route="{_escape(route)}",method="{_escape(method)}"'
+            cumulative = 0
+            for bound, count in zip(buckets, row):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},'
+                             f'le="{_format_bound(bound)}"}} {cumulative}')
+            cumulative += row[len(buckets)]
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {row[-1]}')
+            lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def _make_histograms():
+    directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+    if directory:
+        return FileHistograms(directory)
+    return Histograms()
+
+
+histograms = _make_histograms()
@@ -0,0 +1,125 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .metrics import histograms
+
+logger = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = 'unmatched'
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE',
+                           'OPTIONS'))
+
+# Счётчик текущего запроса. Контекст копируется в потоки sync_to_async,
+# так что запросы к базе из них попадают в счётчик своего запроса.
+_current_timer = ContextVar('metrics_query_timer', default=None)
+
+
+class QueryTimer:
+    """Число SQL-запросов и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+def count_query(execute, sql, params, many, context):
+    """execute_wrapper, постоянно висящий на каждом соединении."""
+    timer = _current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.count += 1
+        timer.duration += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """Обработчик connection_created."""
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    """Время ответа, число и время SQL-запросов и размер ответа
+    по маршрутам (имя URL, например recipes-list). Для потоковых
+    ответов замер заканчивается, когда тело отдано целиком."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timer = QueryTimer()
+        start = time.perf_counter()
+        token = _current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, start)
+
+    async def __acall__(self, request):
+        timer = QueryTimer()
+        start = time.perf_counter()
+        token = _current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_timer.reset(token)
+        return self._finish(request, response, timer, start)
+
+    def _finish(self, request, response, timer, start):
+        if response.streaming:
+            response.streaming_content = self._stream(
+                request, response.streaming_content, timer, start)
+            return response
+        self._observe(request, timer, start, len(response.content))
+        return response
+
+    def _stream(self, request, content, timer, start):
+        size = 0
+        token = _current_timer.set(timer)
+        try:
+            for chunk in content:
+                size += len(chunk)
+                yield chunk
+        finally:
+            try:
+                _current_timer.reset(token)
+            except ValueError:
+                _current_timer.set(None)
+            self._observe(request, timer, start, size)
+
+    @staticmethod
+    def _observe(request, timer, start, size):
+        match = request.resolver_match
+        values = {
+            'foodgram_request_duration_seconds': time.perf_counter() - start,
+            'foodgram_request_sql_queries': timer.count,
+            'foodgram_request_sql_duration_seconds': timer.duration,
+            'foodgram_response_size_bytes': size,
+        }
+        # Сбой записи метрик не должен превращать ответ в 500.
+        try:
+            histograms.observe(
+                match.view_name if match else UNMATCHED_ROUTE,
+                request.method if request.method in KNOWN_METHODS
+                else 'OTHER',
+                values,
+            )
+        except Exception:
+            logger.exception('Не удалось записать метрики запроса')
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
+
+from .filters import ORDERING_POPULAR, POPULAR_ORDERING
+
+
+class RecipeCursorPagination(CursorPagination):
+    """Keyset-пагинация ленты рецептов: без COUNT и OFFSET,
+    стоимость страницы не зависит от её глубины."""
+    ordering = ('-pub_date', '-id')
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        if request.query_params.get('ordering') == ORDERING_POPULAR:
+            return POPULAR_ORDERING
+        return super().get_ordering(request, queryset, view)
+
+
+class RecipePagination(PageNumberPagination):
+    """Постраничная пагинация рецептов; с параметром pagination=cursor
+    переключается на RecipeCursorPagination.
+
+    Курсор держит позицию по дате публикации или рейтингу и не умеет
+    листать по релевантности, поэтому search в этом режиме принимается
+    только вместе с ordering=popular, иначе — ошибка 400."""
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+
+    def __init__(self):
+        self.cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if params.get(self.mode_query_param) == self.cursor_mode:
+            if (params.get('search', '').strip()
+                    and params.get('ordering') != ORDERING_POPULAR):
+                raise ValidationError({self.mode_query_param: (
+                    'Поиск по релевантности недоступен с pagination=cursor: '
+                    'используйте постраничный режим или ordering=popular.')})
+            self.cursor_paginator = RecipeCursorPagination()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class RecipeFeedPagination(CursorPagination):
+    """Курсор ленты подписок: id последнего отданного рецепта.
+    Страницы подбирает get_feed_ids, а не выборка, поэтому лента
+    листается только вперёд."""
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def paginate_ids(self, request, get_ids):
+        """Вызывает get_ids(before_id, limit) и возвращает id страницы."""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before_id = None
+        if cursor is not None and cursor.position is not None:
+            try:
+                before_id = int(cursor.position)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        ids = get_ids(before_id, self.page_size + 1)
+        self.has_next = len(ids) > self.page_size
+        ids = ids[:self.page_size]
+        self.next_position = ids[-1] if self.has_next else None
+        return ids
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=str(self.next_position)))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
@@ -1,3 +1,6 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from rest_framework import permissions
 
 
@@ -16,3 +19,16 @@ class AuthorOrReadOnly(permissions.BasePermission):
             request.method in permissions.SAFE_METHODS
             or request.user == obj.author
         )
+
+
+class MetricsPermission(permissions.BasePermission):
+    """Доступ к метрикам: администратор или заголовок
+    Authorization: Bearer <METRICS_TOKEN>."""
+
+    def has_permission(self, request, view):
+        token = getattr(settings, 'METRICS_TOKEN', '')
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if token and header.startswith('Bearer '):
+            return compare_digest(header[len('Bearer '):].encode(),
+                                  token.encode())
+        return bool(request.user and request.user.is_staff)
@@ -1,15 +1,17 @@
+from django.conf import settings
 from django.db import transaction
-from django.core.files.base import ContentFile
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from djoser.serializers import (UserCreateSerializer
                                 as DjoserUserCreateSerializer)
 
 from posts.models import (Tag, Ingredient, Recipe, IngredientsRecipe,
                           Favorite, ShoppingCard, Subscribe)
-from .utils import create_ingredients
+from posts.shopping_cart import sync_recipe_totals
+from .cache import bump_recipe_generations
+from .fields import HashedBase64ImageField, ThumbnailsField
+from .utils import (PREFETCHED_RECIPES_ATTR, create_ingredients,
+                    get_recipes_limit, get_subscribed_ids, sync_ingredients)
 
 User = get_user_model()
 
@@ -30,23 +32,21 @@ class UserSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        return (self.context.get('request').user.is_authenticated
-                and Subscribe.objects.filter(
-                    user=self.context.get('request').user,
-                    author=obj
-        ).exists())
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in get_subscribed_ids(self.context.get('request'))
 
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
-        fields = fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit')
 
 
 class IngredientWriteSerializer(serializers.ModelSerializer):
@@ -59,13 +59,14 @@ class IngredientWriteSerializer(serializers.ModelSerializer):
 
 
 class IngredientRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.IntegerField()
-    measurement_unit = serializers.CharField()
-    name = serializers.CharField()
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
 
     class Meta:
         model = IngredientsRecipe
-        fields = ('id', 'name', 'measurement_unit')
+        fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
 class RecipeReadSerializer(serializers.ModelSerializer):
@@ -73,6 +74,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         read_only=True,
     )
     ingredients = IngredientRecipeSerializer(
+        source='recipe',
         read_only=True,
         many=True
     )
@@ -80,8 +82,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         read_only=True,
         many=True,
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         fields = ('id', 'author', 'ingredients', 'tags', 'image',
@@ -89,83 +91,72 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart')
         model = Recipe
 
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        user_object = get_object_or_404(User, username=user)
-        return Favorite.objects.filter(user=user_object, recipe=obj).exists()
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        if not user.is_authenticated:
-            return False
-        user_object = get_object_or_404(User, username=user)
-        return ShoppingCard.objects.filter(user=user_object,
-                                           recipe=obj).exists()
-
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(required=False)
+    image = HashedBase64ImageField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        write_only=True,
+        allow_empty=False,
+    )
 
     class Meta:
         fields = ('id', 'author', 'ingredients', 'tags',
                   'name', 'text', 'cooking_time', 'image')
         model = Recipe
 
+    def validate_ingredients(self, value):
+        """Проверяет существование всех ингредиентов одним запросом."""
+        ingredient_ids = set(value)
+        found = set(Ingredient.objects.filter(
+            pk__in=ingredient_ids).values_list('id', flat=True))
+        missing = sorted(ingredient_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                f'Недопустимый первичный ключ "{missing[0]}" - '
+                f'объект не существует.')
+        return value
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['ingredients'] = list(instance.recipe.order_by(
+            'id').values_list('ingredient_id', flat=True))
+        return {field: data[field] for field in self.Meta.fields}
+
+    @transaction.atomic
     def create(self, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
+        validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
-        image_data = validated_data.pop('image')
-        image_content = image_data.read()
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags_data)
-        recipe.ingredients.set(ingredients_data)
-        recipe.image.save(f'{recipe.name}.jpg',
-                          ContentFile(image_content), save=True)
         create_ingredients(self.context['ingredients'], recipe)
+        bump_recipe_generations(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
+        validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         instance.name = validated_data.get('name', instance.name)
         instance.text = validated_data.get('text', instance.text)
         instance.cooking_time = validated_data.get('cooking_time',
                                                    instance.cooking_time)
         instance.image = validated_data.get('image', instance.image)
+        instance.save()
         instance.tags.set(tags_data)
-        instance.ingredients.set(ingredients_data)
-        ingredient_recipes = IngredientsRecipe.objects.filter(recipe=instance)
-        ingredients_mapping = {ingredient['id']: ingredient for
-                               ingredient in self.context['ingredients']}
-
-        with transaction.atomic():
-            for ingredient_recipe in ingredient_recipes:
-                amount = ingredients_mapping.get(ingredient_recipe.
-                                                 ingredient_id,
-                                                 {}).get('amount')
-                if amount is not None:
-                    ingredient_recipe.amount = amount
-                    ingredient_recipe.save()
-            new_ingredient_recipes = [
-                IngredientsRecipe(
-                    recipe=instance,
-                    ingredient_id=ingredient['id'],
-                    amount=ingredient.get('amount')
-                )
-                for ingredient in self.context['ingredients']
-                if ingredient['id'] not in ingredients_mapping
-            ]
-            IngredientsRecipe.objects.bulk_create(new_ingredient_recipes)
+        old_totals, new_totals = sync_ingredients(
+            self.context['ingredients'], instance)
+        sync_recipe_totals(instance.id, old_totals, new_totals)
+        bump_recipe_generations(instance)
         return instance
 
 
 class SubscribeRecipeSerializer(serializers.ModelSerializer):
+    thumbnails = ThumbnailsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class SubscribeListSerializer(serializers.ModelSerializer):
@@ -186,8 +177,9 @@ class SubscribeListSerializer(serializers.ModelSerializer):
         read_only=True)
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(
-        source='author.recipes.count')
+    recipes_count = serializers.IntegerField(
+        source='author.recipes_count',
+        read_only=True)
 
     class Meta:
         model = Subscribe
@@ -195,19 +187,20 @@ class SubscribeListSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed', 'recipes', 'recipes_count',)
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipes.all()
+        recipes = getattr(obj.author, PREFETCHED_RECIPES_ATTR, None)
+        if recipes is None:
+            recipes = obj.author.recipes.order_by('-id')
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
         return SubscribeRecipeSerializer(
             recipes,
-            many=True).data
+            many=True,
+            context=self.context).data
 
     def get_is_subscribed(self, obj):
-        subscribe = Subscribe.objects.filter(
-            user=self.context.get('request').user,
-            author=obj.author
-        )
-        if subscribe:
-            return True
-        return False
+        return obj.author_id in get_subscribed_ids(
+            self.context.get('request'))
 
 
 class SubscribeCreateSerializer(serializers.ModelSerializer):
@@ -228,23 +221,44 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         source='recipe.image',
         read_only=True,
     )
+    thumbnails = ThumbnailsField(
+        source='recipe.image',
+    )
     cooking_time = serializers.ReadOnlyField(
         source='recipe.cooking_time',
     )
 
     class Meta:
         model = ShoppingCard
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
-    id = serializers.ReadOnlyField()
-    name = serializers.ReadOnlyField()
+    id = serializers.ReadOnlyField(
+        source='recipe.id',
+    )
+    name = serializers.ReadOnlyField(
+        source='recipe.name',
+    )
     image = serializers.CharField(
+        source='recipe.image',
         read_only=True,
     )
-    cooking_time = serializers.ReadOnlyField()
+    thumbnails = ThumbnailsField(
+        source='recipe.image',
+    )
+    cooking_time = serializers.ReadOnlyField(
+        source='recipe.cooking_time',
+    )
 
     class Meta:
         model = Favorite
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
+
+
+class BatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE,
+    )
@@ -0,0 +1,162 @@
+import csv
+import hashlib
+import json
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import F
+from rest_framework import renderers
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from posts.models import ShoppingCartIngredient
+
+SHOPPING_LIST_TITLE = 'Список покупок:'
+CURSOR_CHUNK_SIZE = 500
+PDF_FONT_NAME = 'ShoppingListFont'
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+PDF_LINE_HEIGHT = 18
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """Рендерер-заглушка: тело выгрузки формирует генератор, рендерер
+    нужен только для выбора формата через ?format= и Accept."""
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, (bytes, str)):
+            return data
+        return json.dumps(data, ensure_ascii=False)
+
+
+class TxtRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CsvRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JsonRenderer(ShoppingListRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class PdfRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+
+def get_shopping_list(user):
+    """Список покупок пользователя из агрегата ShoppingCartIngredient,
+    отсортированный по названию. Читается серверным курсором."""
+    return ShoppingCartIngredient.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit',
+        ingredient_amount=F('total_amount'),
+    ).order_by(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).iterator(chunk_size=CURSOR_CHUNK_SIZE)
+
+
+def get_shopping_list_etag(user, export_format):
+    """ETag выгрузки: хэш упорядоченных пар (ингредиент, количество)
+    агрегата пользователя и времени изменения ингредиентов, чтобы
+    переименование или смена единицы тоже меняли ETag. Один запрос
+    по узким строкам без построения самого списка."""
+    rows = ShoppingCartIngredient.objects.filter(
+        user=user
+    ).order_by('ingredient_id').values_list(
+        'ingredient_id', 'total_amount', 'ingredient__updated'
+    ).iterator(chunk_size=CURSOR_CHUNK_SIZE)
+    digest = hashlib.md5(f'{user.id}:{export_format}'.encode())
+    for ingredient_id, total_amount, updated in rows:
+        digest.update(
+            f':{ingredient_id}={total_amount}@{updated.isoformat()}'.encode())
+    return '"{}"'.format(digest.hexdigest())
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    yield f'{SHOPPING_LIST_TITLE}\n'
+    for row in rows:
+        yield (f'\n{row["ingredient__name"]} - {row["ingredient_amount"]}, '
+               f'{row["ingredient__measurement_unit"]}')
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow((row['ingredient__name'],
+                               row['ingredient__measurement_unit'],
+                               row['ingredient_amount']))
+
+
+def render_json(rows):
+    yield '['
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps({
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'amount': row['ingredient_amount'],
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+def get_pdf_font():
+    font_path = getattr(settings, 'SHOPPING_LIST_PDF_FONT', None)
+    if not font_path or not os.path.exists(font_path):
+        return 'Helvetica'
+    if PDF_FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(PDF_FONT_NAME, font_path))
+    return PDF_FONT_NAME
+
+
+def render_pdf(rows):
+    """PDF собирается постранично; готовый документ отдаётся частями."""
+    buffer = BytesIO()
+    font = get_pdf_font()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    y = height - PDF_MARGIN
+    pdf.setFont(font, PDF_FONT_SIZE)
+    pdf.drawString(PDF_MARGIN, y, SHOPPING_LIST_TITLE)
+    for row in rows:
+        y -= PDF_LINE_HEIGHT
+        if y < PDF_MARGIN:
+            pdf.showPage()
+            pdf.setFont(font, PDF_FONT_SIZE)
+            y = height - PDF_MARGIN
+        pdf.drawString(
+            PDF_MARGIN, y,
+            f'{row["ingredient__name"]} - {row["ingredient_amount"]}, '
+            f'{row["ingredient__measurement_unit"]}'
+        )
+    pdf.save()
+    buffer.seek(0)
+    yield from iter(lambda: buffer.read(64 * 1024), b'')
+
+
+RENDERERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+    'pdf': render_pdf,
+}
@@ -0,0 +1,99 @@
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from foodgram.db import close_unusable_connections
+from posts.models import Ingredient, IngredientsRecipe, Recipe, Tag, TagRecipe
+from posts.utils import row_signals_muted
+from .authentication import invalidate_tokens, invalidate_user_tokens
+from .cache import (BASE_GENERATION, bump_generations,
+                    bump_recipe_generations)
+from .ingredient_index import ingredient_index
+from .middleware import install_query_counter
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(pre_delete, sender=Recipe)
+def invalidate_recipe_cache(sender, instance, **kwargs):
+    bump_recipe_generations(instance)
+
+
+@receiver(post_save, sender=IngredientsRecipe)
+@receiver(post_delete, sender=IngredientsRecipe)
+@receiver(post_save, sender=TagRecipe)
+@receiver(post_delete, sender=TagRecipe)
+def invalidate_recipe_part_cache(sender, instance, **kwargs):
+    if row_signals_muted():
+        return
+    recipe = Recipe.objects.filter(pk=instance.recipe_id).first()
+    if recipe is not None:
+        bump_recipe_generations(recipe)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe_tags_cache(sender, instance, action, reverse, pk_set,
+                                 **kwargs):
+    if action not in ('pre_clear', 'post_add', 'post_remove'):
+        return
+    if reverse:
+        bump_generations([BASE_GENERATION])
+        return
+    if action == 'pre_clear':
+        bump_recipe_generations(instance)
+        return
+    bump_recipe_generations(instance, Tag.objects.filter(
+        pk__in=pk_set).values_list('slug', flat=True))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_catalogue_cache(sender, **kwargs):
+    bump_generations([BASE_GENERATION])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cache(sender, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    bump_generations([BASE_GENERATION])
+
+
+# Снимки сбрасываются после фиксации транзакции: иначе запрос,
+# промахнувшийся мимо кэша до неё, прочитает старую строку и положит
+# её в кэш уже под новым поколением.
+@receiver(post_delete, sender=Token)
+def invalidate_token_snapshot(sender, instance, using, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_tokens([key]), using=using)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_token_snapshots(sender, instance, created, using,
+                                    update_fields=None, **kwargs):
+    if created or (update_fields is not None
+                   and set(update_fields) <= {'last_login'}):
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalidate_user_tokens(user_id),
+                          using=using)
+
+
+request_started.connect(close_unusable_connections,
+                        dispatch_uid='close_unusable_connections')
+connection_created.connect(install_query_counter,
+                           dispatch_uid='install_query_counter')
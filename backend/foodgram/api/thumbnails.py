@@ -0,0 +1,142 @@
+import os
+import posixpath
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+from posts.models import Recipe
+
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+SOURCE_PREFIX = 'recipe/'
+# При превышении THUMBNAIL_CACHE_MAX_BYTES кэш ужимается до этой доли
+# лимита, чтобы обход каталога не повторялся на каждом промахе.
+EVICT_TO_RATIO = 0.9
+
+
+class ThumbnailCache:
+    """Дисковый кэш уменьшенных копий картинок рецептов.
+
+    Копия создаётся при первом запросе и дальше отдаётся с диска.
+    Исходники хранятся по хешу содержимого и не меняются, поэтому копии
+    не устаревают.
+
+    Процесс ведёт счётчик занятого места и время обращений к копиям
+    в памяти; каталог обходится только при первом промахе и когда
+    счётчик превышает THUMBNAIL_CACHE_MAX_BYTES. Тогда размер
+    пересчитывается по диску (с копиями других процессов) и удаляются
+    давно не запрашивавшиеся копии. Время обращения копии, которую
+    процесс не запрашивал, — mtime файла, то есть время её создания.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._accessed = {}
+        self._total = None
+
+    @property
+    def root(self):
+        return settings.THUMBNAIL_CACHE_DIR
+
+    @staticmethod
+    def is_valid_source(source):
+        return (source.startswith(SOURCE_PREFIX)
+                and posixpath.normpath(source) == source
+                and '..' not in source.split('/'))
+
+    def read(self, source, size, image_format):
+        """Содержимое копии или None, если параметры или исходник
+        некорректны."""
+        if (size not in settings.THUMBNAIL_SIZES
+                or image_format not in THUMBNAIL_FORMATS
+                or not self.is_valid_source(source)):
+            return None
+        path = os.path.join(self.root, size, image_format,
+                            f'{source}.{image_format}')
+        try:
+            with open(path, 'rb') as thumbnail:
+                content = thumbnail.read()
+        except FileNotFoundError:
+            if not self._render(source, size, image_format, path):
+                return None
+            with open(path, 'rb') as thumbnail:
+                content = thumbnail.read()
+            self._add(path, len(content))
+        else:
+            with self._lock:
+                self._accessed[path] = time.time()
+        return content
+
+    def _render(self, source, size, image_format, path):
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(source):
+            return False
+        pil_format, _ = THUMBNAIL_FORMATS[image_format]
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with storage.open(source) as source_file:
+                with Image.open(source_file) as image:
+                    image.thumbnail(settings.THUMBNAIL_SIZES[size])
+                    if pil_format == 'JPEG' and image.mode != 'RGB':
+                        image = image.convert('RGB')
+                    image.save(temp_path, pil_format,
+                               quality=settings.THUMBNAIL_QUALITY)
+        except (OSError, UnidentifiedImageError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+        os.replace(temp_path, path)
+        return True
+
+    def _scan(self):
+        """[(время обращения, размер, путь)] всех копий на диске."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                accessed = max(stat.st_mtime, self._accessed.get(path, 0))
+                entries.append((accessed, stat.st_size, path))
+        return entries
+
+    def _add(self, path, size):
+        with self._lock:
+            self._accessed[path] = time.time()
+            if self._total is None:
+                self._total = sum(
+                    file_size for _, file_size, _ in self._scan())
+            else:
+                self._total += size
+            if self._total > settings.THUMBNAIL_CACHE_MAX_BYTES:
+                self._evict(keep=path)
+
+    def _evict(self, keep):
+        entries = sorted(self._scan())
+        total = sum(file_size for _, file_size, _ in entries)
+        limit = settings.THUMBNAIL_CACHE_MAX_BYTES * EVICT_TO_RATIO
+        accessed = {}
+        for accessed_at, file_size, path in entries:
+            if total <= limit or path == keep:
+                accessed[path] = accessed_at
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= file_size
+        self._accessed = accessed
+        self._total = total
+
+
+thumbnail_cache = ThumbnailCache()
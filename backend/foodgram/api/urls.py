@@ -1,11 +1,14 @@
 from rest_framework.routers import DefaultRouter
 
+from django.conf import settings
 from django.urls import include, path
 
 from api.views import (TagsViewSet, IngredientsViewSet,
                        RecipeViewSet, FavoriteViewSet,
                        ShoppingCartViewSet,
-                       SubcribeCreateDeleteViewSet)
+                       SubcribeCreateDeleteViewSet, ThumbnailView,
+                       MetricsView)
+from api.async_views import make_async_urls
 from users.views import UserViewSet
 
 
@@ -26,5 +29,9 @@ router.register(
 
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('thumbnails/<str:size>/<str:image_format>/<path:source>',
+         ThumbnailView.as_view(), name='thumbnail'),
+    path('', include(make_async_urls(router.urls)
+                     if settings.ASYNC_VIEWS else router.urls)),
 ]
@@ -1,18 +1,133 @@
-from posts.models import IngredientsRecipe
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+
+from posts.models import IngredientsRecipe, Recipe, Subscribe
+from posts.utils import mute_row_signals
+
+SUBSCRIBED_IDS_ATTR = '_subscribed_author_ids'
+PREFETCHED_RECIPES_ATTR = 'prefetched_recipes'
 
 
 def create_ingredients(ingredients, recipe):
     """Вспомогательная функция для добавления ингредиентов.
-    Используется при создании/редактировании рецепта."""
-    ingredient_list = []
+    Используется при создании рецепта."""
+    IngredientsRecipe.objects.bulk_create(
+        IngredientsRecipe(
+            recipe=recipe,
+            ingredient_id=ingredient_id,
+            amount=amount,
+        )
+        for ingredient_id, amount in get_ingredient_amounts(
+            ingredients).items()
+    )
+
+
+def get_ingredient_amounts(ingredients):
+    """Переданные ингредиенты в виде {ingredient_id: amount};
+    повторы одного ингредиента складываются."""
+    amounts = Counter()
     for ingredient in ingredients:
-        ingredient_id = ingredient.get('id')
-        amount = ingredient.get('amount')
-        ingredient_list.append(
-            IngredientsRecipe(
+        amounts[int(ingredient['id'])] += int(ingredient['amount'])
+    return amounts
+
+
+def sync_ingredients(ingredients, recipe):
+    """Приводит ингредиенты рецепта к переданному составу одним
+    bulk_update, одним bulk_create и одним delete.
+    Возвращает старый и новый состав: {ingredient_id: amount}."""
+    new_amounts = get_ingredient_amounts(ingredients)
+    existing = {
+        row.ingredient_id: row
+        for row in IngredientsRecipe.objects.filter(recipe=recipe)
+    }
+    old_amounts = Counter({
+        ingredient_id: row.amount
+        for ingredient_id, row in existing.items()
+    })
+    to_update, to_create = [], []
+    for ingredient_id, amount in new_amounts.items():
+        row = existing.get(ingredient_id)
+        if row is None:
+            to_create.append(IngredientsRecipe(
                 recipe=recipe,
                 ingredient_id=ingredient_id,
-                amount=amount
-            )
+                amount=amount,
+            ))
+        elif row.amount != amount:
+            row.amount = amount
+            to_update.append(row)
+    to_delete = [row.pk for ingredient_id, row in existing.items()
+                 if ingredient_id not in new_amounts]
+    with transaction.atomic():
+        if to_delete:
+            # Кэш рецепта сбрасывает вызывающий код, а не сигнал
+            # на каждую строку.
+            with mute_row_signals():
+                IngredientsRecipe.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            IngredientsRecipe.objects.bulk_update(to_update, ('amount',))
+        if to_create:
+            IngredientsRecipe.objects.bulk_create(to_create)
+    return old_amounts, new_amounts
+
+
+def get_subscribed_ids(request):
+    """Множество id авторов, на которых подписан пользователь запроса.
+    Загружается одним запросом и кэшируется на объекте запроса."""
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    subscribed_ids = getattr(request, SUBSCRIBED_IDS_ATTR, None)
+    if subscribed_ids is None:
+        subscribed_ids = frozenset(
+            Subscribe.objects.filter(user=request.user)
+            .values_list('author_id', flat=True)
         )
-    IngredientsRecipe.objects.bulk_create(ingredient_list)
+        setattr(request, SUBSCRIBED_IDS_ATTR, subscribed_ids)
+    return subscribed_ids
+
+
+def annotate_is_subscribed(queryset, user):
+    """Аннотирует queryset пользователей флагом is_subscribed
+    для текущего пользователя."""
+    if not user.is_authenticated:
+        return queryset.annotate(
+            is_subscribed=Value(False, output_field=BooleanField()))
+    return queryset.annotate(is_subscribed=Exists(
+        Subscribe.objects.filter(user=user, author=OuterRef('pk'))))
+
+
+def get_positive_int_param(request, name):
+    """Положительное целое значение параметра запроса name или None,
+    если он не задан или некорректен."""
+    if request is None:
+        return None
+    try:
+        value = int(request.query_params.get(name))
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def get_recipes_limit(request):
+    return get_positive_int_param(request, 'recipes_limit')
+
+
+def get_subscriptions_queryset(user, recipes_limit=None):
+    """Подписки пользователя с авторами (число рецептов берётся из
+    счётчика автора) и не более recipes_limit последних рецептов
+    каждого автора, загруженными одним запросом для всей страницы."""
+    recipes = Recipe.objects.order_by('-id')
+    if recipes_limit:
+        recipes = recipes.filter(pk__in=Subquery(
+            Recipe.objects.filter(author_id=OuterRef('author_id'))
+            .order_by('-id').values('pk')[:recipes_limit]
+        ))
+    return Subscribe.objects.filter(user=user).select_related(
+        'author',
+    ).prefetch_related(
+        Prefetch('author__recipes', queryset=recipes,
+                 to_attr=PREFETCHED_RECIPES_ATTR),
+    )
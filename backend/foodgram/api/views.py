@@ -1,21 +1,42 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, Max, OuterRef,
+                              Prefetch, Value)
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 
 from django_filters.rest_framework import DjangoFilterBackend
 
 from rest_framework import viewsets, filters, status, mixins
 from rest_framework.decorators import action
 from rest_framework.generics import CreateAPIView
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.views import APIView
+from rest_framework.permissions import (SAFE_METHODS, AllowAny,
+                                        IsAuthenticated)
 from rest_framework.response import Response
 
 from .filters import IngredientFilter, RecipesFilter
+from .pagination import RecipeFeedPagination, RecipePagination
+from posts.shopping_cart import add_recipes_to_totals
+from posts.utils import insert_or_ignore
 from posts.models import (Tag, Ingredient, Recipe,
                           Favorite, ShoppingCard, Subscribe, IngredientsRecipe)
 from api import serializers
+from api import metrics
+from api import shopping_list
+from api.cache import (cached_response, get_detail_generations,
+                       get_list_generations)
+from api.conditional import (conditional_response, get_collection_state,
+                             get_collection_validators, make_etag,
+                             related_aggregate)
+from api.ingredient_index import ingredient_index
+from api.thumbnails import THUMBNAIL_FORMATS, thumbnail_cache
+from api.batch import batch_add, batch_remove, get_batch_ids
+from api.feed import get_feed_ids
+from api.utils import (get_positive_int_param, get_recipes_limit,
+                       get_subscriptions_queryset)
+from api.permission import MetricsPermission
 # from api.permission import AdminOrReadOnly, AuthorOrReadOnly
 
 
@@ -38,6 +59,13 @@ class TagsViewSet(viewsets.ModelViewSet):
     filterset_fields = ('name', 'slug')
     search_fields = ('^name',)
 
+    def list(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            *get_collection_validators(
+                request, get_collection_state(Tag.objects.all())),
+            lambda: super(TagsViewSet, self).list(request, *args, **kwargs))
+
 
 class IngredientsViewSet(viewsets.ModelViewSet):
     # permission_classes = (AdminOrReadOnly,)
@@ -46,62 +74,187 @@ class IngredientsViewSet(viewsets.ModelViewSet):
     pagination_class = None
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        state = get_collection_state(Ingredient.objects.all())
+        return conditional_response(
+            request,
+            *get_collection_validators(request, state),
+            lambda: Response(ingredient_index.search(
+                request.query_params.get('name', ''),
+                get_positive_int_param(request, 'limit'),
+                version=state,
+            )))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = PageNumberPagination
+    pagination_class = RecipePagination
     filterset_class = RecipesFilter
     # permission_classes = (AuthorOrReadOnly)
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, get_list_generations(request),
+            lambda: super(RecipeViewSet, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            recipe_id = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise Http404
+        # Тело зависит и от автора, тегов и ингредиентов: их состояние
+        # читается тем же запросом, что и флаги пользователя. Last-Modified
+        # изменения автора не видит, поэтому не отправляется.
+        state = Recipe.objects.filter(pk=recipe_id).annotate(
+            **self.get_user_flags(),
+            is_subscribed=Exists(Subscribe.objects.filter(
+                user_id=request.user.id, author=OuterRef('author'))),
+            tags_count=related_aggregate(
+                Recipe.tags.through.objects, 'recipe', Count('pk')),
+            tags_updated=related_aggregate(
+                Recipe.tags.through.objects, 'recipe', Max('tag__updated')),
+            ingredients_count=related_aggregate(
+                IngredientsRecipe.objects, 'recipe', Count('pk')),
+            ingredients_updated=related_aggregate(
+                IngredientsRecipe.objects, 'recipe',
+                Max('ingredient__updated')),
+        ).values('updated', 'is_favorited', 'is_in_shopping_cart',
+                 'is_subscribed', 'author__email', 'author__username',
+                 'author__first_name', 'author__last_name', 'tags_count',
+                 'tags_updated', 'ingredients_count',
+                 'ingredients_updated').first()
+        if state is None:
+            return super().retrieve(request, *args, **kwargs)
+        etag = make_etag(recipe_id, request.user.id, *sorted(state.items()))
+        return conditional_response(
+            request, etag, None,
+            lambda: cached_response(
+                request, get_detail_generations(recipe_id),
+                lambda: super(RecipeViewSet, self).retrieve(
+                    request, *args, **kwargs),
+                version=etag))
+
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS:
             return serializers.RecipeReadSerializer
         return serializers.RecipeWriteSerializer
 
+    def get_user_flags(self):
+        """Аннотации is_favorited и is_in_shopping_cart для текущего
+        пользователя: по одному подзапросу EXISTS на всю страницу."""
+        user = self.request.user
+        if not user.is_authenticated:
+            return {
+                'is_favorited': Value(False, output_field=BooleanField()),
+                'is_in_shopping_cart': Value(False,
+                                             output_field=BooleanField()),
+            }
+        return {
+            'is_favorited': Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            'is_in_shopping_cart': Exists(ShoppingCard.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        }
+
     def get_queryset(self):
-        if self.action in ['retrieve', 'update', 'partial_update', 'destroy']:
-            return Recipe.objects.all().prefetch_related(
-                'author',
-                'ingredients',
-                'tags',
-            ).distinct()
+        queryset = Recipe.objects.select_related(
+            'author',
+        ).prefetch_related(
+            Prefetch('recipe', queryset=IngredientsRecipe.objects.
+                     select_related('ingredient')),
+            'tags',
+        ).annotate(**self.get_user_flags())
+        if self.action in ['retrieve', 'update', 'partial_update', 'destroy',
+                           'feed']:
+            return queryset
 
         is_in_shopping_cart = (self.request.
                                query_params.get('is_in_shopping_cart'))
         if is_in_shopping_cart:
-            return Recipe.objects.filter(recipe_shopping_cart__user=self.
-                                         request.user)
+            return queryset.filter(recipe_shopping_cart__user=self.
+                                   request.user)
 
         tags = self.request.query_params.getlist('tags')
-        return Recipe.objects.filter(tags__slug__in=tags).prefetch_related(
-            'author',
-            'ingredients',
-            'tags',
-        ).distinct()
+        return queryset.filter(tags__slug__in=tags).distinct()
 
     @action(
         detail=False,
         methods=('GET',),
         permission_classes=(IsAuthenticated, ),
         url_path='download_shopping_cart',
+        renderer_classes=(shopping_list.TxtRenderer,
+                          shopping_list.CsvRenderer,
+                          shopping_list.JsonRenderer,
+                          shopping_list.PdfRenderer),
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientsRecipe.objects.filter(
-            recipe__recipe_shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(ingredient_amount=Sum('amount'))
-        shopping_list = ['Список покупок:\n']
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['ingredient_amount']
-            shopping_list.append(f'\n{name} - {amount}, {unit}')
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = \
-            'attachment; filename="shopping_cart.txt"'
+        renderer = request.accepted_renderer
+        export_format = renderer.format
+        etag = shopping_list.get_shopping_list_etag(request.user,
+                                                    export_format)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = StreamingHttpResponse(
+            shopping_list.RENDERERS[export_format](
+                shopping_list.get_shopping_list(request.user)
+            ),
+            content_type=(f'{renderer.media_type}; charset={renderer.charset}'
+                          if renderer.charset else renderer.media_type),
+        )
+        response['ETag'] = etag
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{export_format}"')
         return response
 
+    @action(detail=False, permission_classes=(IsAuthenticated,))
+    def feed(self, request):
+        """Лента новых рецептов авторов, на которых подписан
+        пользователь, с курсорной пагинацией."""
+        paginator = RecipeFeedPagination()
+        ids = paginator.paginate_ids(
+            request, lambda before_id, limit: get_feed_ids(
+                request.user, before_id, limit))
+        recipes = list(self.get_queryset().filter(
+            pk__in=ids).order_by('-id'))
+        for recipe in recipes:
+            # Авторы ленты подписаны по определению: не загружаем
+            # весь список подписок ради is_subscribed.
+            recipe.author.is_subscribed = True
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=('post', 'delete'), detail=False,
+            url_path='favorite', permission_classes=(IsAuthenticated,))
+    def favorite_batch(self, request):
+        """Добавление и удаление нескольких рецептов в избранном."""
+        ids = get_batch_ids(request)
+        if request.method == 'POST':
+            results, _ = batch_add(request.user, Favorite, 'recipe',
+                                   Recipe, ids)
+        else:
+            results, _ = batch_remove(request.user, Favorite, 'recipe', ids)
+        return Response({'results': results})
+
+    @action(methods=('post', 'delete'), detail=False,
+            url_path='shopping_cart', permission_classes=(IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        """Добавление и удаление нескольких рецептов в корзине:
+        список покупок обновляется одним пакетом."""
+        ids = get_batch_ids(request)
+        user_id = request.user.id
+        if request.method == 'POST':
+            results, _ = batch_add(
+                request.user, ShoppingCard, 'recipe', Recipe, ids,
+                on_added=lambda added: add_recipes_to_totals(
+                    user_id, added))
+        else:
+            results, _ = batch_remove(
+                request.user, ShoppingCard, 'recipe', ids,
+                on_removed=lambda removed: add_recipes_to_totals(
+                    user_id, removed, sign=-1))
+        return Response({'results': results})
+
     def update(self, request, *args, **kwargs):
         instance = self.get_object()
         data = request.data
@@ -144,22 +297,26 @@ class SubcribeCreateDeleteViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
-        # return self.request.user.follower.all()
-        return Subscribe.objects.filter(user=self.request.user)
+        return get_subscriptions_queryset(
+            self.request.user, get_recipes_limit(self.request))
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context['author_id'] = self.kwargs.get('user_id')
         return context
 
-    def perform_create(self, serializer):
-        user_id = self.kwargs.get('user_id')
-        if Subscribe.objects.filter(user=self.request.user,
-                                    author_id=user_id).exists():
+    def create(self, request, *args, **kwargs):
+        author = get_object_or_404(User, id=self.kwargs.get('user_id'))
+        if author == request.user:
+            return Response({'errors': 'Нельзя подписаться на себя'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        subscribe, created = insert_or_ignore(
+            Subscribe, user=request.user, author=author)
+        if not created:
             return Response({'errors': 'Вы уже подписаны на автора'},
                             status=status.HTTP_400_BAD_REQUEST)
-        serializer.save(user=self.request.user, author_id=user_id)
-        return Response(status=status.HTTP_201_CREATED)
+        serializer = self.get_serializer(subscribe)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=('delete',), detail=True)
     def delete(self, request, user_id):
@@ -193,32 +350,29 @@ class ShoppingCartViewSet(viewsets.ModelViewSet):
         context['recipe_id'] = self.kwargs.get('recipe_id')
         return context
 
-    def perform_create(self, serializer):
-
-        if ShoppingCard.objects.filter(user=self.request.user,
-                                       recipe_id=self.kwargs.get('recipe_id')
-                                       ).exists():
+    def create(self, request, *args, **kwargs):
+        recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
+        with transaction.atomic():
+            shopping_card, created = insert_or_ignore(
+                ShoppingCard, user=request.user, recipe=recipe)
+        if not created:
             return Response({'errors': 'Рецепт уже в корзине'},
                             status=status.HTTP_400_BAD_REQUEST)
-        serializer.save(
-            user=self.request.user,
-            recipe=get_object_or_404(
-                Recipe,
-                id=self.kwargs.get('recipe_id')
-            )
-        )
+        serializer = self.get_serializer(shopping_card)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=('delete',), detail=True)
     def delete(self, request, recipe_id):
         try:
             user = request.user
-            shopping_cards = user.shopping_cart.filter(recipe_id=recipe_id)
+            with transaction.atomic():
+                deleted_count, _ = user.shopping_cart.filter(
+                    recipe_id=recipe_id).delete()
 
-            if not shopping_cards.exists():
+            if deleted_count == 0:
                 return Response({'errors': 'Рецепта нет в корзине'},
                                 status=status.HTTP_400_BAD_REQUEST)
 
-            shopping_cards.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
 
         except Exception as e:
@@ -237,21 +391,15 @@ class FavoriteViewSet(CreateDestroyViewSet):
         context['recipe_id'] = self.kwargs.get('recipe_id')
         return context
 
-    def perform_create(self, serializer):
-
-        if Favorite.objects.filter(user=self.request.user,
-                                   recipe_id=self.kwargs.get('recipe_id')
-                                   ).exists():
+    def create(self, request, *args, **kwargs):
+        recipe = get_object_or_404(Recipe, id=self.kwargs.get('recipe_id'))
+        favorite, created = insert_or_ignore(
+            Favorite, user=request.user, recipe=recipe)
+        if not created:
             return Response({'errors': 'Рецепт уже в избранном'},
                             status=status.HTTP_400_BAD_REQUEST)
-
-        serializer.save(
-            user=self.request.user,
-            recipe=get_object_or_404(
-                Recipe,
-                id=self.kwargs.get('recipe_id')
-            )
-        )
+        serializer = self.get_serializer(favorite)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(methods=('delete',), detail=True)
     def delete(self, request, recipe_id):
@@ -282,3 +430,27 @@ class RegisterView(CreateAPIView):
         sz.is_valid(raise_exception=True)
         sz.save()
         return Response(sz.data, status=status.HTTP_201_CREATED)
+
+
+class ThumbnailView(APIView):
+    """Уменьшенная копия картинки рецепта, создаётся при первом запросе."""
+    authentication_classes = ()
+    permission_classes = (AllowAny,)
+
+    def get(self, request, size, image_format, source):
+        content = thumbnail_cache.read(source, size, image_format)
+        if content is None:
+            raise Http404
+        response = HttpResponse(
+            content, content_type=THUMBNAIL_FORMATS[image_format][1])
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class MetricsView(APIView):
+    """Метрики запросов в текстовом формате Prometheus."""
+    permission_classes = (MetricsPermission,)
+
+    def get(self, request):
+        return HttpResponse(metrics.render(metrics.histograms.snapshot()),
+                            content_type=metrics.CONTENT_TYPE)
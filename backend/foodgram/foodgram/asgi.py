@@ -9,8 +9,17 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
 
-application = get_asgi_application()
+
+def get_application():
+    # Как get_asgi_application(), но с обработчиком, который читает
+    # тело потоковых ответов вне цикла событий.
+    django.setup(set_prefix=False)
+    from api.async_views import StreamingASGIHandler
+    return StreamingASGIHandler()
+
+
+application = get_application()
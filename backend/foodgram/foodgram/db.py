@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY_DB = 'default'
+REPLICA_DB = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Изменяемый словарь, а не значение: отметка о записи, сделанная
+# в потоке sync_to_async, должна быть видна и самому запросу.
+_request_state = ContextVar('db_request_state', default=None)
+
+
+def is_replica_allowed():
+    """Чтение с реплики разрешено только внутри безопасного HTTP-запроса
+    и только пока в нём ничего не записано в основную базу."""
+    state = _request_state.get()
+    return state is not None and state['read_only'] and not state['pinned']
+
+
+def pin_to_primary():
+    state = _request_state.get()
+    if state is not None:
+        state['pinned'] = True
+
+
+@contextmanager
+def read_only_request(read_only):
+    token = _request_state.set({'read_only': read_only, 'pinned': False})
+    try:
+        yield
+    finally:
+        try:
+            _request_state.reset(token)
+        except ValueError:
+            # Тело потокового ответа может дочитываться в другом контексте.
+            _request_state.set(None)
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов API идут на реплику, всё остальное —
+    на основную базу. После первой записи запрос до конца читает
+    с основной базы, чтобы видеть собственные изменения."""
+
+    def db_for_read(self, model, **hints):
+        if REPLICA_DB in settings.DATABASES and is_replica_allowed():
+            return REPLICA_DB
+        return PRIMARY_DB
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY_DB
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return {obj1._state.db, obj2._state.db} <= {PRIMARY_DB, REPLICA_DB}
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DB
+
+
+class ReplicaRoutingMiddleware:
+    """Отмечает запрос как доступный для чтения с реплики."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        with read_only_request(request.method in SAFE_METHODS):
+            return self._finish(self.get_response(request))
+
+    async def __acall__(self, request):
+        with read_only_request(request.method in SAFE_METHODS):
+            return self._finish(await self.get_response(request))
+
+    def _finish(self, response):
+        if response.streaming:
+            response.streaming_content = self._stream(
+                is_replica_allowed(), response.streaming_content)
+        return response
+
+    @staticmethod
+    def _stream(read_only, content):
+        with read_only_request(read_only):
+            yield from content
+
+
+def close_unusable_connections(**kwargs):
+    """Проверка постоянных соединений в начале запроса: соединение,
+    которое база успела закрыть, закрывается и открывается заново,
+    а не роняет запрос."""
+    if not getattr(settings, 'DB_HEALTH_CHECKS', False):
+        return
+    for connection in connections.all():
+        if connection.connection is not None and not connection.is_usable():
+            connection.close()
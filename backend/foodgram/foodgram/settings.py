@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'foodgram.db.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,18 +77,45 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# wsgi — синхронные воркеры gunicorn; asgi — uvicorn-воркеры
+# и асинхронные представления для горячих маршрутов чтения.
+SERVER_MODE = os.getenv('SERVER_MODE', 'wsgi')
+ASYNC_VIEWS = SERVER_MODE == 'asgi'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 16))
+
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.postgresql'),
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django_user'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', '7364'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Постоянные соединения: секунды жизни, 0 — закрывать после запроса.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # При работе через PgBouncer в режиме transaction серверные
+        # курсоры (.iterator()) не переживают смену соединения.
+        'DISABLE_SERVER_SIDE_CURSORS': (
+            os.getenv('DB_POOLER', '').lower() == 'pgbouncer'),
     }
 }
 
+# Проверять постоянные соединения в начале каждого запроса.
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'true').lower() == 'true'
+
+# Реплика для чтения: настройки, не заданные явно, берутся у основной
+# базы. Для тестов реплика зеркалирует основную базу.
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['foodgram.db.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.0/ref/settings/#auth-password-validators
@@ -118,7 +147,7 @@ REST_FRAMEWORK = {
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',)
+        'api.authentication.CachedTokenAuthentication',)
 }
 
 AUTH_USER_MODEL = 'users.User'
@@ -146,6 +175,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+IMAGE_MAX_SIZE = int(os.getenv('IMAGE_MAX_SIZE', 5 * 1024 * 1024))
+IMAGE_DECODE_WORKERS = int(os.getenv('IMAGE_DECODE_WORKERS', 2))
+IMAGE_DECODE_TIMEOUT = int(os.getenv('IMAGE_DECODE_TIMEOUT', 30))
+
+THUMBNAIL_SIZES = {
+    'small': (160, 160),
+    'medium': (480, 480),
+}
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_CACHE_DIR = os.getenv(
+    'THUMBNAIL_CACHE_DIR', os.path.join(MEDIA_ROOT, 'thumbnails'))
+THUMBNAIL_CACHE_MAX_BYTES = int(
+    os.getenv('THUMBNAIL_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 
@@ -154,6 +197,49 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static/data'),
 ]
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 300))
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+# Каталог для файлов метрик процессов gunicorn; очищать при старте.
+METRICS_MULTIPROCESS_DIR = os.getenv('METRICS_MULTIPROCESS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Снимки пользователей по токену: в памяти процесса и, по желанию,
+# в общем кэше. Другие воркеры узнают о выходе или смене пароля
+# не позже чем через AUTH_TOKEN_CACHE_TTL секунд.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 4096))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 30))
+AUTH_TOKEN_SHARED_CACHE = os.getenv(
+    'AUTH_TOKEN_SHARED_CACHE', 'false').lower() == 'true'
+AUTH_TOKEN_SHARED_CACHE_TTL = int(
+    os.getenv('AUTH_TOKEN_SHARED_CACHE_TTL', 300))
+
+# Рейтинг ordering=popular: вес избранного и корзины, период
+# полураспада вклада рецепта в днях. Пересчёт — update_popularity.
+POPULARITY_FAVORITE_WEIGHT = float(
+    os.getenv('POPULARITY_FAVORITE_WEIGHT', 1.0))
+POPULARITY_CART_WEIGHT = float(os.getenv('POPULARITY_CART_WEIGHT', 1.5))
+POPULARITY_HALF_LIFE_DAYS = float(
+    os.getenv('POPULARITY_HALF_LIFE_DAYS', 7))
+
+# Лента подписок: при большем числе авторов вместо соединения
+# используется слияние по индексу (author_id, -id).
+FEED_MERGE_MIN_AUTHORS = int(os.getenv('FEED_MERGE_MIN_AUTHORS', 50))
+
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', 100))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -1,12 +1,15 @@
 from django.contrib import admin
 
 from .models import (Ingredient, Recipe, Tag,
-                     IngredientsRecipe, Favorite, ShoppingCard, Subscribe)
+                     IngredientsRecipe, Favorite, ShoppingCard,
+                     ShoppingCartIngredient, Subscribe)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'author', 'name', 'image', 'text',)
+    list_display = ('id', 'author', 'name', 'image', 'text',
+                    'favorites_count', 'in_carts_count',)
+    readonly_fields = ('favorites_count', 'in_carts_count',)
 
 
 @admin.register(Ingredient)
@@ -18,5 +21,6 @@ class IngredientAdmin(admin.ModelAdmin):
 admin.site.register(Favorite)
 admin.site.register(IngredientsRecipe)
 admin.site.register(ShoppingCard)
+admin.site.register(ShoppingCartIngredient)
 admin.site.register(Subscribe)
 admin.site.register(Tag)
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Favorite, Recipe, ShoppingCard, Subscribe
+
+User = get_user_model()
+
+RECONCILE_BATCH_SIZE = 1000
+
+# (модель строк, внешний ключ, модель со счётчиком, поле счётчика)
+COUNTERS = (
+    (Favorite, 'recipe', Recipe, 'favorites_count'),
+    (ShoppingCard, 'recipe', Recipe, 'in_carts_count'),
+    (Recipe, 'author', User, 'recipes_count'),
+    (Subscribe, 'author', User, 'followers_count'),
+)
+
+
+def change_counter(model, field, ids, delta):
+    """Прибавляет delta к счётчику field объектов ids одним UPDATE."""
+    ids = list(ids)
+    if ids and delta:
+        model.objects.filter(pk__in=ids).update(**{field: F(field) + delta})
+
+
+def count_ids(source, fk, ids, delta):
+    """Обновляет счётчики после добавления (delta=1) или удаления
+    (delta=-1) строк source, ссылающихся через fk на объекты ids.
+    Вызывается в транзакции, в которой меняются сами строки."""
+    for counter_source, counter_fk, model, field in COUNTERS:
+        if counter_source is source and counter_fk == fk:
+            change_counter(model, field, ids, delta)
+
+
+def count_instance(instance, delta):
+    """То же для одной строки: по запросу на каждый её счётчик."""
+    for source, fk, model, field in COUNTERS:
+        if isinstance(instance, source):
+            change_counter(model, field, [getattr(instance, f'{fk}_id')],
+                           delta)
+
+
+def actual_count(source, fk):
+    """Выражение с настоящим числом строк source для объекта."""
+    return Coalesce(Subquery(
+        source.objects.filter(**{fk: OuterRef('pk')}).order_by()
+        .values(fk).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def find_drift(source, fk, model, field):
+    """[(id, записанное значение, настоящее значение)] для объектов,
+    у которых счётчик разошёлся со строками."""
+    return list(model.objects.annotate(
+        actual=actual_count(source, fk),
+    ).exclude(**{field: F('actual')}).order_by('pk').values_list(
+        'pk', field, 'actual'))
+
+
+def reconcile_counters(check=False):
+    """Находит и, если не check, исправляет расхождения всех счётчиков.
+    Возвращает {'Модель.поле': [(id, было, стало)]}. Исправленное
+    значение пересчитывается в самом UPDATE, так что изменения,
+    сделанные после поиска расхождений, не теряются."""
+    report = {}
+    for source, fk, model, field in COUNTERS:
+        drift = find_drift(source, fk, model, field)
+        report[f'{model.__name__}.{field}'] = drift
+        if check:
+            continue
+        ids = [pk for pk, _, _ in drift]
+        for start in range(0, len(ids), RECONCILE_BATCH_SIZE):
+            with transaction.atomic():
+                model.objects.filter(
+                    pk__in=ids[start:start + RECONCILE_BATCH_SIZE],
+                ).update(**{field: actual_count(source, fk)})
+    return report
@@ -1,36 +1,177 @@
 import csv
-import os
+import json
 import logging
-from django.core.management.base import BaseCommand
+import os
+import time
+from io import StringIO
+
 from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
 
 from posts.models import Ingredient
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8') as csv_file:
+        for row in csv.reader(csv_file, delimiter=','):
+            if len(row) >= 2:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    """Массив объектов {"name": ..., "measurement_unit": ...};
+    файл в формате JSON Lines читается построчно."""
+    with open(path, 'r', encoding='utf-8') as json_file:
+        if json_file.read(1) != '[':
+            json_file.seek(0)
+            for line in json_file:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item['name'], item['measurement_unit']
+            return
+        json_file.seek(0)
+        for item in json.load(json_file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+    'jsonl': read_json,
+}
+
+
+def unique_rows(rows):
+    """Убирает пустые строки и дубликаты (название, единица)."""
+    seen = set()
+    for name, measurement_unit in rows:
+        key = (name.strip(), measurement_unit.strip())
+        if key[0] and key[1] and key not in seen:
+            seen.add(key)
+            yield key
+
+
+def batched(rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_bulk(batch):
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, measurement_unit=measurement_unit)
+         for name, measurement_unit in batch),
+        ignore_conflicts=True,
+    )
+
+
+def insert_copy(batch):
+    """COPY пачки во временную таблицу и INSERT ... ON CONFLICT DO NOTHING
+    в таблицу ингредиентов (только PostgreSQL)."""
+    table = Ingredient._meta.db_table
+    buffer = StringIO()
+    csv.writer(buffer).writerows(batch)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS ingredient_import '
+            '(name varchar(200), measurement_unit varchar(200)) '
+            'ON COMMIT DELETE ROWS'
+        )
+        cursor.copy_expert(
+            'COPY ingredient_import (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+        cursor.execute(
+            f'INSERT INTO {table} (name, measurement_unit, updated) '
+            'SELECT name, measurement_unit, %s FROM ingredient_import '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING',
+            [timezone.now()],
+        )
+        cursor.execute('TRUNCATE ingredient_import')
+
 
 class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV или JSON. Повторный запуск '
+            'не создаёт дубликатов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.STATICFILES_DIRS[0],
+                                 'data', 'ingredients.csv'),
+            help='Путь к файлу с ингредиентами (.csv, .json, .jsonl).',
+        )
+        parser.add_argument(
+            '--format',
+            choices=sorted(READERS),
+            help='Формат файла; по умолчанию определяется по расширению.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Количество строк в одной вставке.',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать и проверить файл, ничего не записывая.',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.',
+        )
+
     def handle(self, *args, **options):
-        static_path = settings.STATICFILES_DIRS[0]
-        csv_file_path = os.path.join(static_path, 'data', 'ingredients.csv')
+        path = options['path']
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+        insert = insert_copy if use_copy else insert_bulk
 
+        started = time.perf_counter()
+        count_before = Ingredient.objects.count()
+        count_rows = 0
         try:
-            with open(csv_file_path, 'r', encoding='utf-8') as csv_file:
-                csv_reader = csv.reader(csv_file, delimiter=',')
-                count_created = 0
-
-                for name, measurement_unit in csv_reader:
-                    obj, created = Ingredient.objects.get_or_create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-
-                    if created:
-                        count_created += 1
-
-                logger.info(f'Добавлено {count_created} ингредиентов'
-                            'из файла {csv_file_path}')
-                print(f'Добавлено {count_created} ингредиентов'
-                      'из файла {csv_file_path}')
+            with transaction.atomic():
+                for batch in batched(unique_rows(READERS[file_format](path)),
+                                     options['batch_size']):
+                    count_rows += len(batch)
+                    if not options['dry_run']:
+                        insert(batch)
         except FileNotFoundError as e:
             logger.error(str(e))
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        count_created = Ingredient.objects.count() - count_before
+
+        message = (
+            f'{"Проверено" if options["dry_run"] else "Добавлено"} '
+            f'{count_rows if options["dry_run"] else count_created} '
+            f'ингредиентов из файла {path} '
+            f'({count_rows} уникальных строк, {elapsed:.2f} с, '
+            f'{count_rows / elapsed if elapsed else 0:.0f} строк/с, '
+            f'{"COPY" if use_copy else "bulk_create"})'
+        )
+        logger.info(message)
+        self.stdout.write(message)
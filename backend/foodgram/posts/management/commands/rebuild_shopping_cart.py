@@ -0,0 +1,49 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.models import ShoppingCartIngredient
+from posts.shopping_cart import (compute_shopping_cart_totals,
+                                 rebuild_shopping_cart_totals)
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает агрегат списков покупок по корзинам '
+            'или проверяет его расхождение с ними (--check).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить агрегат с корзинами, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            count = rebuild_shopping_cart_totals()
+            logger.info(f'Агрегат списков покупок пересобран: {count} строк')
+            self.stdout.write(f'Агрегат списков покупок пересобран: '
+                              f'{count} строк')
+            return
+
+        expected = compute_shopping_cart_totals()
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')
+        }
+        mismatches = [
+            (key, stored.get(key), expected.get(key))
+            for key in set(expected) | set(stored)
+            if stored.get(key) != expected.get(key)
+        ]
+        for (user_id, ingredient_id), actual, correct in sorted(
+                mismatches, key=lambda item: item[0]):
+            self.stdout.write(f'user={user_id} ingredient={ingredient_id}: '
+                              f'{actual} вместо {correct}')
+        if mismatches:
+            raise CommandError(f'Расхождений в агрегате: {len(mismatches)}')
+        self.stdout.write('Агрегат списков покупок согласован с корзинами')
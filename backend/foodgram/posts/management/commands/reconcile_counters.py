@@ -0,0 +1,35 @@
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.counters import reconcile_counters
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, корзин, рецептов и подписчиков '
+            'с таблицами связей и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        report = reconcile_counters(check=options['check'])
+        total = 0
+        for counter, drift in report.items():
+            total += len(drift)
+            for pk, stored, actual in drift:
+                self.stdout.write(f'{counter} id={pk}: '
+                                  f'{stored} вместо {actual}')
+        if options['check']:
+            if total:
+                raise CommandError(f'Расхождений в счётчиках: {total}')
+            self.stdout.write('Счётчики согласованы')
+            return
+        logger.info(f'Исправлено счётчиков: {total}')
+        self.stdout.write(f'Исправлено счётчиков: {total}')
@@ -0,0 +1,233 @@
+import logging
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from posts.counters import reconcile_counters
+from posts.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
+                          ShoppingCard, Subscribe, Tag)
+from posts.popularity import recompute_popularity
+from posts.shopping_cart import rebuild_shopping_cart_totals
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+DEFAULT_BATCH_SIZE = 1000
+TAG_COLORS = ('#E26C2D', '#49B64E', '#8775D2', '#F6C344', '#2D8CE2')
+MEASUREMENT_UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.')
+WORDS = ('суп', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'паста',
+         'омлет', 'блины', 'плов', 'борщ', 'котлеты', 'курица', 'рыба',
+         'сырники', 'вареники', 'тыква', 'грибы', 'сыр', 'шоколад')
+
+
+def zipf_weights(count, exponent):
+    """Накопленные веса распределения Ципфа: немногие популярные
+    объекты и длинный хвост, как у авторов и рецептов в проде."""
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def sample_distinct(rng, population, cum_weights, count):
+    """До count различных элементов population с весами cum_weights."""
+    count = min(count, len(population))
+    chosen = set()
+    attempts = 0
+    while len(chosen) < count and attempts < count * 10:
+        chosen.update(rng.choices(population, cum_weights=cum_weights,
+                                  k=count - len(chosen)))
+        attempts += count
+    return chosen
+
+
+def new_ids(model, since_id):
+    """id строк, вставленных после since_id: bulk_create на SQLite
+    не возвращает первичные ключи."""
+    return list(model.objects.filter(id__gt=since_id).order_by(
+        'id').values_list('id', flat=True))
+
+
+def max_id(model):
+    return model.objects.aggregate(value=Max('id'))['value'] or 0
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, рецептами, '
+            'избранным, корзинами и подписками для нагрузочных замеров.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Сколько ингредиентов должно быть в базе; недостающие '
+                 'создаются.')
+        parser.add_argument('--ingredients-per-recipe', type=int,
+                            nargs=2, default=(3, 15), metavar=('MIN', 'MAX'))
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--cart-per-user', type=int, default=5)
+        parser.add_argument('--subscriptions-per-user', type=int,
+                            default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed',
+                            help='Префикс имён создаваемых объектов.')
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['recipes'] < 0:
+            raise CommandError('Нужен хотя бы один пользователь.')
+        if User.objects.filter(
+                username__startswith=f'{options["prefix"]}-').exists():
+            raise CommandError(
+                f'Данные с префиксом {options["prefix"]} уже созданы; '
+                f'укажите другой --prefix.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        with transaction.atomic():
+            tag_ids = self.create_tags(options['tags'])
+            ingredient_ids = self.create_ingredients(options['ingredients'])
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(options['recipes'], user_ids)
+            self.link_tags(recipe_ids, tag_ids)
+            self.link_ingredients(recipe_ids, ingredient_ids,
+                                  *options['ingredients_per_recipe'])
+            self.create_relations(
+                Favorite, 'recipe', user_ids, recipe_ids,
+                options['favorites_per_user'])
+            self.create_relations(
+                ShoppingCard, 'recipe', user_ids, recipe_ids,
+                options['cart_per_user'])
+            self.create_relations(
+                Subscribe, 'author', user_ids, user_ids,
+                options['subscriptions_per_user'])
+            rebuild_shopping_cart_totals()
+            reconcile_counters()
+            recompute_popularity(self.batch_size)
+        cache.clear()
+        message = (f'Создано: пользователей {len(user_ids)}, '
+                   f'рецептов {len(recipe_ids)}, тегов {len(tag_ids)}')
+        logger.info(message)
+        self.stdout.write(message)
+
+    def bulk_create(self, model, objects):
+        since_id = max_id(model)
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return new_ids(model, since_id)
+
+    def create_tags(self, count):
+        tag_ids = []
+        for index in range(count):
+            tag, _ = Tag.objects.get_or_create(
+                slug=f'{self.prefix}-{index}',
+                defaults={'name': f'{self.prefix} тег {index}',
+                          'color': TAG_COLORS[index % len(TAG_COLORS)]},
+            )
+            tag_ids.append(tag.id)
+        return tag_ids
+
+    def create_ingredients(self, count):
+        missing = count - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                (Ingredient(
+                    name=f'{self.rng.choice(WORDS)} {self.prefix} {index}',
+                    measurement_unit=self.rng.choice(MEASUREMENT_UNITS),
+                ) for index in range(missing)),
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+        return list(Ingredient.objects.order_by('id').values_list(
+            'id', flat=True)[:count])
+
+    def create_users(self, count):
+        password = make_password(self.prefix)
+        return self.bulk_create(User, [
+            User(
+                email=f'{self.prefix}-{index}@example.com',
+                username=f'{self.prefix}-{index}',
+                first_name=f'Имя{index}',
+                last_name=f'Фамилия{index}',
+                password=password,
+            )
+            for index in range(count)
+        ])
+
+    def create_recipes(self, count, user_ids):
+        """Авторы выбираются по Ципфу, даты публикации растянуты
+        на год назад от текущего момента."""
+        authors = self.rng.choices(
+            user_ids, cum_weights=zipf_weights(len(user_ids), 1.1), k=count)
+        recipe_ids = self.bulk_create(Recipe, [
+            Recipe(
+                author_id=author_id,
+                name=' '.join(self.rng.sample(WORDS, 2)).capitalize(),
+                text=' '.join(self.rng.choices(WORDS, k=20)),
+                cooking_time=self.rng.randint(5, 120),
+            )
+            for author_id in authors
+        ])
+        now = timezone.now()
+        step = timedelta(days=365) / max(len(recipe_ids), 1)
+        Recipe.objects.bulk_update(
+            [Recipe(id=recipe_id, pub_date=now - step * (
+                len(recipe_ids) - position))
+             for position, recipe_id in enumerate(recipe_ids)],
+            ('pub_date',),
+            batch_size=self.batch_size,
+        )
+        return recipe_ids
+
+    def link_tags(self, recipe_ids, tag_ids):
+        if not tag_ids:
+            return
+        weights = zipf_weights(len(tag_ids), 0.8)
+        Recipe.tags.through.objects.bulk_create(
+            (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+             for recipe_id in recipe_ids
+             for tag_id in sample_distinct(
+                 self.rng, tag_ids, weights, self.rng.randint(1, 3))),
+            batch_size=self.batch_size,
+        )
+
+    def link_ingredients(self, recipe_ids, ingredient_ids, low, high):
+        if not ingredient_ids:
+            return
+        weights = zipf_weights(len(ingredient_ids), 0.9)
+        IngredientsRecipe.objects.bulk_create(
+            (IngredientsRecipe(recipe_id=recipe_id,
+                               ingredient_id=ingredient_id,
+                               amount=self.rng.randint(1, 500))
+             for recipe_id in recipe_ids
+             for ingredient_id in sample_distinct(
+                 self.rng, ingredient_ids, weights,
+                 self.rng.randint(low, high))),
+            batch_size=self.batch_size,
+        )
+
+    def create_relations(self, model, field, user_ids, target_ids, mean):
+        """Связи пользователь -> объект: число на пользователя
+        экспоненциальное со средним mean, цели — по Ципфу."""
+        if not target_ids or mean <= 0:
+            return
+        weights = zipf_weights(len(target_ids), 1.0)
+        model.objects.bulk_create(
+            (model(user_id=user_id, **{f'{field}_id': target_id})
+             for user_id in user_ids
+             for target_id in sample_distinct(
+                 self.rng, target_ids, weights,
+                 int(self.rng.expovariate(1 / mean)))
+             if target_id != user_id or model is not Subscribe),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
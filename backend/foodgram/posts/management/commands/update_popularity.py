@@ -0,0 +1,27 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.popularity import DEFAULT_BATCH_SIZE, recompute_popularity
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рейтинг популярности рецептов для '
+            'ordering=popular. Запускается периодически (cron); '
+            'записывает только изменившиеся строки.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checked, updated = recompute_popularity(options['batch_size'])
+        message = (f'Рейтинг пересчитан: проверено {checked}, '
+                   f'обновлено {updated} за '
+                   f'{time.perf_counter() - started:.2f} с')
+        logger.info(message)
+        self.stdout.write(message)
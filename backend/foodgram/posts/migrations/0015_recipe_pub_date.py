@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def backfill_pub_date(apps, schema_editor):
+    """Разводит даты существующих рецептов по порядку id, чтобы
+    сортировка по дате публикации была однозначной."""
+    Recipe = apps.get_model('posts', 'Recipe')
+    recipes = list(Recipe.objects.order_by('id').only('id'))
+    if not recipes:
+        return
+    base = django.utils.timezone.now() - timedelta(seconds=len(recipes))
+    for position, recipe in enumerate(recipes):
+        recipe.pub_date = base + timedelta(seconds=position)
+    Recipe.objects.bulk_update(recipes, ('pub_date',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipe',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='pub_date',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата публикации'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_pub_date, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+    ]
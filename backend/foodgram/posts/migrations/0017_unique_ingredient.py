@@ -0,0 +1,58 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения
+    в запись с наименьшим id, переназначая ссылки на неё."""
+    Ingredient = apps.get_model('posts', 'Ingredient')
+    IngredientsRecipe = apps.get_model('posts', 'IngredientsRecipe')
+    ShoppingCartIngredient = apps.get_model('posts', 'ShoppingCartIngredient')
+    RecipeIngredient = apps.get_model('posts', 'Recipe').ingredients.through
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit',
+    ).annotate(
+        keep_id=Min('id'), total=Count('id'),
+    ).filter(total__gt=1)
+    for group in duplicates.iterator():
+        keep_id = group['keep_id']
+        duplicate_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=keep_id).values_list('id', flat=True))
+        IngredientsRecipe.objects.filter(
+            ingredient_id__in=duplicate_ids).update(ingredient_id=keep_id)
+        for link in RecipeIngredient.objects.filter(
+                ingredient_id__in=duplicate_ids):
+            if not RecipeIngredient.objects.filter(
+                    recipe_id=link.recipe_id, ingredient_id=keep_id).exists():
+                link.ingredient_id = keep_id
+                link.save()
+            else:
+                link.delete()
+        for row in ShoppingCartIngredient.objects.filter(
+                ingredient_id__in=duplicate_ids):
+            kept, _ = ShoppingCartIngredient.objects.get_or_create(
+                user_id=row.user_id, ingredient_id=keep_id)
+            kept.total_amount += row.total_amount
+            kept.save()
+            row.delete()
+        Ingredient.objects.filter(id__in=duplicate_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_updated_timestamps'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_unit'),
+        ),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:50
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def delete_duplicates(model, fields):
+    """Оставляет по одной строке (с наименьшим id) на набор fields;
+    возвращает значения fields удалённых дубликатов."""
+    duplicates = list(model.objects.order_by().values(*fields).annotate(
+        keep_id=Min('id'), total=Count('id'),
+    ).filter(total__gt=1))
+    for group in duplicates:
+        model.objects.filter(
+            **{field: group[field] for field in fields}
+        ).exclude(id=group['keep_id']).delete()
+    return duplicates
+
+
+def merge_duplicates(apps, schema_editor):
+    Favorite = apps.get_model('posts', 'Favorite')
+    ShoppingCard = apps.get_model('posts', 'ShoppingCard')
+    Subscribe = apps.get_model('posts', 'Subscribe')
+    IngredientsRecipe = apps.get_model('posts', 'IngredientsRecipe')
+    ShoppingCartIngredient = apps.get_model('posts', 'ShoppingCartIngredient')
+
+    delete_duplicates(Favorite, ('user_id', 'recipe_id'))
+    delete_duplicates(Subscribe, ('user_id', 'author_id'))
+
+    duplicate_rows = IngredientsRecipe.objects.order_by().values(
+        'recipe_id', 'ingredient_id',
+    ).annotate(
+        keep_id=Min('id'), total=Count('id'), amount_sum=Sum('amount'),
+    ).filter(total__gt=1)
+    for group in list(duplicate_rows):
+        IngredientsRecipe.objects.filter(
+            id=group['keep_id']).update(amount=group['amount_sum'])
+        IngredientsRecipe.objects.filter(
+            recipe_id=group['recipe_id'],
+            ingredient_id=group['ingredient_id'],
+        ).exclude(id=group['keep_id']).delete()
+
+    user_ids = {group['user_id'] for group in delete_duplicates(
+        ShoppingCard, ('user_id', 'recipe_id'))}
+    if user_ids:
+        ShoppingCartIngredient.objects.filter(user_id__in=user_ids).delete()
+        ShoppingCartIngredient.objects.bulk_create(
+            ShoppingCartIngredient(
+                user_id=row['recipe__recipe_shopping_cart__user_id'],
+                ingredient_id=row['ingredient_id'],
+                total_amount=row['total'],
+            )
+            for row in IngredientsRecipe.objects.filter(
+                recipe__recipe_shopping_cart__user_id__in=user_ids,
+            ).values(
+                'recipe__recipe_shopping_cart__user_id', 'ingredient_id',
+            ).annotate(total=Sum('amount'))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientsrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcard',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_cart'),
+        ),
+        migrations.AddConstraint(
+            model_name='subscribe',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscribe'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 3.2.13 on 2026-10-18 18:52
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}text, '')), 'B')"
+)
+
+
+def create_search_trigger(apps, schema_editor):
+    """Триггер, поддерживающий search_vector, и GIN-индекс по нему.
+    Только для PostgreSQL: на других базах поиск идёт без вектора."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f"""
+        CREATE FUNCTION posts_recipe_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_VECTOR_SQL.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER posts_recipe_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF name, text ON posts_recipe
+        FOR EACH ROW EXECUTE PROCEDURE posts_recipe_search_vector_update();
+    """)
+    schema_editor.execute(
+        f"UPDATE posts_recipe SET search_vector = "
+        f"{SEARCH_VECTOR_SQL.format(row='')};"
+    )
+    schema_editor.execute(
+        'CREATE INDEX recipe_search_vector_idx ON posts_recipe '
+        'USING GIN (search_vector);'
+    )
+
+
+def drop_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx;')
+    schema_editor.execute(
+        'DROP TRIGGER IF EXISTS posts_recipe_search_vector_trigger '
+        'ON posts_recipe;'
+    )
+    schema_editor.execute(
+        'DROP FUNCTION IF EXISTS posts_recipe_search_vector_update();')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_unique_user_relations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_trigger, drop_search_trigger),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:12
+
+from django.db import migrations, models
+import posts.popularity
+
+
+def fill_popularity(apps, schema_editor):
+    Recipe = apps.get_model('posts', 'Recipe')
+    recipes = list(Recipe.objects.only(
+        'favorites_count', 'in_carts_count', 'pub_date'))
+    for recipe in recipes:
+        recipe.popularity = posts.popularity.popularity_score(
+            recipe.favorites_count, recipe.in_carts_count, recipe.pub_date)
+    Recipe.objects.bulk_update(recipes, ('popularity',), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0021_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.FloatField(default=posts.popularity.initial_popularity, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(fill_popularity, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-id'], name='recipe_popularity_id_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:22
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def delete_self_subscriptions(apps, schema_editor):
+    Subscribe = apps.get_model('posts', 'Subscribe')
+    User = apps.get_model('users', 'User')
+    rows = Subscribe.objects.filter(user=models.F('author'))
+    author_ids = list(rows.values_list('author_id', flat=True))
+    rows.delete()
+    User.objects.filter(pk__in=author_ids).update(
+        followers_count=models.F('followers_count') - 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_recipe_author_id_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_self_subscriptions,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscribe',
+            constraint=models.CheckConstraint(check=models.Q(('user', django.db.models.expressions.F('author')), _negated=True), name='prevent_self_subscribe'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.13 on 2026-10-18 19:23
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_prevent_self_subscribe'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='recipe',
+            name='ingredients',
+        ),
+    ]
@@ -0,0 +1,21 @@
+class DenormalizedFieldsMixin:
+    """Модель с денормализованными полями (счётчики, рейтинг).
+
+    Такие поля меняются только запросами UPDATE: F()-выражениями или
+    пакетным пересчётом. Обычный save() существующего объекта их
+    не записывает, иначе он затёр бы значение, изменённое другим
+    запросом после загрузки объекта.
+    """
+    denormalized_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.denormalized_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
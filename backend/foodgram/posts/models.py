@@ -1,10 +1,14 @@
 from colorfield.fields import ColorField
 
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
 from posts import validators
+from posts.mixins import DenormalizedFieldsMixin
+from posts.popularity import initial_popularity
+from posts.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -26,6 +30,11 @@ class Tag(models.Model):
         verbose_name="Слаг",
         validators=(validators.validate_slug, )
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Дата изменения",
+    )
 
     class Meta:
         verbose_name = "Тег"
@@ -45,26 +54,33 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name="Мера измерения",
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name="Дата изменения",
+    )
 
     class Meta:
         verbose_name = "Ингредиент"
         verbose_name_plural = "Ингредиенты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_name_unit',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(DenormalizedFieldsMixin, models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Автор',
         related_name='recipes',
     )
-    ingredients = models.ManyToManyField(
-        Ingredient,
-        verbose_name='Ингридиент',
-    )
     tags = models.ManyToManyField(
         Tag,
         verbose_name='Tег',
@@ -74,6 +90,7 @@ class Recipe(models.Model):
         null=True,
         verbose_name='Картинка',
         upload_to='recipe/',
+        storage=ContentAddressedStorage(),
     )
     name = models.CharField(
         max_length=200,
@@ -90,10 +107,50 @@ class Recipe(models.Model):
                                       message="Максимальное время - 120")],
         verbose_name='Время приготовления (в минутах)'
     )
+    pub_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата публикации',
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+    popularity = models.FloatField(
+        default=initial_popularity,
+        editable=False,
+        verbose_name='Популярность',
+    )
+
+    denormalized_fields = ('favorites_count', 'in_carts_count',
+                           'popularity')
 
     class Meta:
+        ordering = ('-pub_date', '-id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('-popularity', '-id'),
+                         name='recipe_popularity_id_idx'),
+            models.Index(fields=('author', '-id'),
+                         name='recipe_author_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -117,6 +174,12 @@ class Favorite(models.Model):
         ordering = ['user']
         verbose_name = ('Избранный рецепт')
         verbose_name_plural = ('Избранные рецепты')
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_favorite',
+            ),
+        ]
 
     def __str__(self):
         return f'Рецепт {self.recipe} в избранном у пользователя {self.user}.'
@@ -140,6 +203,12 @@ class IngredientsRecipe(models.Model):
     class Meta:
         verbose_name = 'Ингредиент в рецепте'
         verbose_name_plural = 'Ингредиенты в рецепте'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient',
+            ),
+        ]
 
     def __str__(self):
         return self.ingredient
@@ -175,12 +244,53 @@ class ShoppingCard(models.Model):
 
     class Meta:
         verbose_name = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_shopping_cart',
+            ),
+        ]
 
     def __str__(self):
         return (f'Пользователь {self.user} добавил в '
                 f'список покупок рецепт {self.recipe}.')
 
 
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается вместе с изменениями ShoppingCard и ингредиентов
+    рецептов, пересобирается командой rebuild_shopping_cart."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_cart_ingredients',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_cart_totals',
+    )
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.total_amount}'
+
+
 class Subscribe(models.Model):
     user = models.ForeignKey(
         User,
@@ -199,6 +309,16 @@ class Subscribe(models.Model):
         ordering = ['-id']
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_subscribe',
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_subscribe',
+            ),
+        ]
 
     def __str__(self):
         return f'Пользователь {self.user} подписан на автора {self.author}.'
@@ -0,0 +1,69 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# Точка отсчёта времени публикации: держит значения рейтинга
+# небольшими, чтобы float не терял точность.
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+PRECISION = 6
+DEFAULT_BATCH_SIZE = 1000
+
+
+def get_decay_scale():
+    """Время в секундах, за которое вклад рецепта убывает в e раз."""
+    return settings.POPULARITY_HALF_LIFE_DAYS * 86400 / math.log(2)
+
+
+def popularity_score(favorites_count, in_carts_count, pub_date):
+    """Рейтинг рецепта.
+
+    Вес рецепта — взвешенная сумма избранного и корзин, затухающая
+    экспоненциально с возрастом рецепта:
+    weight * exp(-(now - pub_date) / scale). Хранится логарифм этой
+    величины без слагаемого -now / scale, общего для всех рецептов:
+    log(1 + weight) + (pub_date - EPOCH) / scale. Порядок рецептов
+    тот же, а значение не зависит от текущего момента и меняется
+    только вместе со счётчиками, поэтому пересчёт трогает лишь
+    изменившиеся строки.
+    """
+    weight = (settings.POPULARITY_FAVORITE_WEIGHT * favorites_count
+              + settings.POPULARITY_CART_WEIGHT * in_carts_count)
+    age = (pub_date - EPOCH).total_seconds()
+    return round(math.log1p(weight) + age / get_decay_scale(), PRECISION)
+
+
+def initial_popularity():
+    """Рейтинг нового рецепта без избранного и корзин."""
+    return popularity_score(0, 0, timezone.now())
+
+
+def recompute_popularity(batch_size=DEFAULT_BATCH_SIZE):
+    """Пересчитывает рейтинг всех рецептов пачками по batch_size
+    в порядке id. Записывает только строки, рейтинг которых изменился.
+    Возвращает (проверено, обновлено)."""
+    # Модуль импортируется из posts.models ради initial_popularity.
+    from posts.models import Recipe
+
+    checked = updated = 0
+    last_id = 0
+    while True:
+        rows = list(Recipe.objects.filter(pk__gt=last_id).order_by(
+            'pk').values_list('pk', 'favorites_count', 'in_carts_count',
+                              'pub_date', 'popularity')[:batch_size])
+        if not rows:
+            return checked, updated
+        changed = []
+        for pk, favorites_count, in_carts_count, pub_date, stored in rows:
+            score = popularity_score(favorites_count, in_carts_count,
+                                     pub_date)
+            if score != stored:
+                changed.append(Recipe(pk=pk, popularity=score))
+        if changed:
+            with transaction.atomic():
+                Recipe.objects.bulk_update(changed, ('popularity',))
+        checked += len(rows)
+        updated += len(changed)
+        last_id = rows[-1][0]
@@ -0,0 +1,135 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+
+from posts.models import (IngredientsRecipe, ShoppingCard,
+                          ShoppingCartIngredient)
+
+
+def get_recipe_ingredient_totals(recipe_id):
+    """Количество каждого ингредиента в рецепте: {ingredient_id: amount}.
+    Принимает и список id — тогда суммирует по всем рецептам."""
+    if isinstance(recipe_id, (list, tuple, set, frozenset)):
+        rows = IngredientsRecipe.objects.filter(recipe_id__in=recipe_id)
+    else:
+        rows = IngredientsRecipe.objects.filter(recipe_id=recipe_id)
+    return Counter(dict(
+        rows
+        .values('ingredient_id')
+        .annotate(total=Sum('amount'))
+        .values_list('ingredient_id', 'total')
+    ))
+
+
+def compute_shopping_cart_totals(user_ids=None):
+    """Агрегат списков покупок, посчитанный с нуля по корзинам:
+    {(user_id, ingredient_id): total_amount}."""
+    rows = IngredientsRecipe.objects.filter(
+        recipe__recipe_shopping_cart__isnull=False,
+    )
+    if user_ids is not None:
+        rows = rows.filter(recipe__recipe_shopping_cart__user_id__in=user_ids)
+    return {
+        (user_id, ingredient_id): total
+        for user_id, ingredient_id, total in rows.values(
+            'recipe__recipe_shopping_cart__user_id', 'ingredient_id',
+        ).annotate(
+            total=Sum('amount'),
+        ).values_list(
+            'recipe__recipe_shopping_cart__user_id', 'ingredient_id', 'total',
+        )
+    }
+
+
+@transaction.atomic
+def apply_shopping_cart_deltas(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta} к агрегату:
+    не более одного bulk_update, bulk_create и delete."""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    existing = {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingCartIngredient.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in deltas},
+            ingredient_id__in={ingredient_id for _, ingredient_id in deltas},
+        )
+    }
+    to_create, to_update, to_delete = [], [], []
+    for (user_id, ingredient_id), delta in deltas.items():
+        row = existing.get((user_id, ingredient_id))
+        if row is None:
+            if delta > 0:
+                to_create.append(ShoppingCartIngredient(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=delta,
+                ))
+            continue
+        row.total_amount += delta
+        if row.total_amount > 0:
+            to_update.append(row)
+        else:
+            to_delete.append(row.pk)
+    if to_update:
+        ShoppingCartIngredient.objects.bulk_update(to_update,
+                                                   ('total_amount',))
+    if to_create:
+        ShoppingCartIngredient.objects.bulk_create(to_create)
+    if to_delete:
+        ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipe_to_totals(user_id, recipe_id, sign=1):
+    """Добавляет (sign=1) или вычитает (sign=-1) ингредиенты рецепта
+    из списка покупок пользователя."""
+    add_recipes_to_totals(user_id, [recipe_id], sign)
+
+
+def add_recipes_to_totals(user_id, recipe_ids, sign=1):
+    """То же для нескольких рецептов: один запрос на их состав."""
+    if not recipe_ids:
+        return
+    apply_shopping_cart_deltas({
+        (user_id, ingredient_id): sign * amount
+        for ingredient_id, amount in get_recipe_ingredient_totals(
+            recipe_ids).items()
+    })
+
+
+def sync_recipe_totals(recipe_id, old_totals, new_totals=None):
+    """Переносит изменение состава рецепта на списки покупок всех
+    пользователей, у которых рецепт в корзине."""
+    if new_totals is None:
+        new_totals = get_recipe_ingredient_totals(recipe_id)
+    changes = {
+        ingredient_id: new_totals[ingredient_id] - old_totals[ingredient_id]
+        for ingredient_id in set(old_totals) | set(new_totals)
+    }
+    changes = {key: delta for key, delta in changes.items() if delta}
+    if not changes:
+        return
+    user_ids = ShoppingCard.objects.filter(
+        recipe_id=recipe_id).values_list('user_id', flat=True)
+    apply_shopping_cart_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in changes.items()
+    })
+
+
+@transaction.atomic
+def rebuild_shopping_cart_totals(user_ids=None):
+    """Пересобирает агрегат с нуля; возвращает число записанных строк."""
+    totals = compute_shopping_cart_totals(user_ids)
+    rows = ShoppingCartIngredient.objects.all()
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    rows.delete()
+    ShoppingCartIngredient.objects.bulk_create(
+        ShoppingCartIngredient(user_id=user_id, ingredient_id=ingredient_id,
+                               total_amount=total)
+        for (user_id, ingredient_id), total in totals.items()
+    )
+    return len(totals)
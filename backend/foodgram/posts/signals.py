@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from posts.counters import count_instance
+from posts.models import Favorite, Recipe, ShoppingCard, Subscribe
+from posts.shopping_cart import add_recipe_to_totals
+from posts.utils import row_signals_muted
+
+
+@receiver(post_save, sender=ShoppingCard)
+def add_to_shopping_cart_totals(sender, instance, created, **kwargs):
+    if created:
+        add_recipe_to_totals(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCard)
+def remove_from_shopping_cart_totals(sender, instance, **kwargs):
+    if row_signals_muted():
+        return
+    add_recipe_to_totals(instance.user_id, instance.recipe_id, sign=-1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCard)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_save, sender=Recipe)
+def increment_counters(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        count_instance(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCard)
+@receiver(post_delete, sender=Subscribe)
+@receiver(post_delete, sender=Recipe)
+def decrement_counters(sender, instance, **kwargs):
+    if row_signals_muted():
+        return
+    count_instance(instance, -1)
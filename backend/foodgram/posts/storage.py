@@ -0,0 +1,40 @@
+import os
+import uuid
+
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище файлов, имена которых — хеш содержимого.
+
+    Одинаковое имя означает одинаковое содержимое, поэтому повторная
+    загрузка не создаёт копию, а записанный файл никогда не меняется.
+    Запись идёт во временный файл с атомарной подменой, так что
+    одновременные загрузки одного файла безопасны.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.tmp')
+        if hasattr(content, 'temporary_file_path'):
+            file_move_safe(content.temporary_file_path(), temp_path)
+        else:
+            with open(temp_path, 'wb') as temp_file:
+                locks.lock(temp_file, locks.LOCK_EX)
+                for chunk in content.chunks():
+                    temp_file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(temp_path, self.file_permissions_mode)
+        os.replace(temp_path, full_path)
+        return name
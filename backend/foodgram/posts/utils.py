@@ -0,0 +1,141 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.signals import post_save
+
+_row_signals_muted = ContextVar('row_signals_muted', default=False)
+
+
+def row_signals_muted():
+    return _row_signals_muted.get()
+
+
+@contextmanager
+def mute_row_signals():
+    """Внутри блока обработчики сигналов отдельных строк (агрегаты,
+    счётчики, кэш) ничего не делают: вызывающий код обновляет их сам
+    одним пакетом."""
+    token = _row_signals_muted.set(True)
+    try:
+        yield
+    finally:
+        _row_signals_muted.reset(token)
+
+
+@transaction.atomic
+def insert_or_ignore(model, **values):
+    """Вставляет строку одним запросом INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает (объект, created). Для созданной строки отправляется
+    post_save, как при обычном save(), чтобы обработчики сигналов
+    (агрегаты, счётчики, кэш) видели изменение в той же транзакции.
+    """
+    instance = model(**values)
+    using = router.db_for_write(model, instance=instance)
+    connection = connections[using]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    for field in fields:
+        field.pre_save(instance, add=True)
+    if connection.vendor in ('postgresql', 'sqlite'):
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields)
+        placeholders = ', '.join(['%s'] * len(fields))
+        pk_column = connection.ops.quote_name(model._meta.pk.column)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES ({placeholders}) '
+                f'ON CONFLICT DO NOTHING RETURNING {pk_column}',
+                [field.get_db_prep_save(getattr(instance, field.attname),
+                                        connection)
+                 for field in fields],
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return instance, False
+        instance.pk = row[0]
+        instance._state.adding = False
+        instance._state.db = using
+    else:
+        try:
+            with transaction.atomic(using=using):
+                instance.save(using=using, force_insert=True)
+        except IntegrityError:
+            return instance, False
+        return instance, True
+    post_save.send(sender=model, instance=instance, created=True,
+                   update_fields=None, raw=False, using=using)
+    return instance, True
+
+
+def bulk_insert_or_ignore(model, rows):
+    """Вставляет строки одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает только реально созданные объекты. Сигналы post_save
+    не отправляются: агрегаты обновляет вызывающий код одним пакетом.
+    """
+    instances = [model(**values) for values in rows]
+    if not instances:
+        return []
+    using = router.db_for_write(model)
+    connection = connections[using]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if not field.primary_key
+    ]
+    for instance in instances:
+        for field in fields:
+            field.pre_save(instance, add=True)
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        created = []
+        for instance in instances:
+            try:
+                with transaction.atomic(using=using):
+                    model.objects.using(using).bulk_create([instance])
+            except IntegrityError:
+                continue
+            created.append(instance)
+        return created
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk_column = connection.ops.quote_name(model._meta.pk.column)
+    columns = [connection.ops.quote_name(field.column) for field in fields]
+    row_placeholders = '({})'.format(', '.join(['%s'] * len(fields)))
+    params = [
+        field.get_db_prep_save(getattr(instance, field.attname), connection)
+        for instance in instances
+        for field in fields
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES '
+            f'{", ".join([row_placeholders] * len(instances))} '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {pk_column}, {", ".join(columns)}',
+            params,
+        )
+        returned = cursor.fetchall()
+    created = []
+    for row in returned:
+        instance = model(pk=row[0], **{
+            field.attname: value for field, value in zip(fields, row[1:])
+        })
+        instance._state.adding = False
+        instance._state.db = using
+        created.append(instance)
+    return created
+
+
+def bulk_delete(queryset, field):
+    """Удаляет строки выборки одним delete() с заглушёнными
+    обработчиками сигналов строк. Возвращает множество значений field
+    удалённых строк."""
+    with transaction.atomic(using=queryset.db), mute_row_signals():
+        rows = list(queryset.select_for_update().values_list('pk', field))
+        if rows:
+            queryset.model.objects.filter(
+                pk__in=[pk for pk, _ in rows]).delete()
+    return {value for _, value in rows}
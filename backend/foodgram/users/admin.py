@@ -3,4 +3,10 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-admin.site.register(User)
+
+@admin.register(User)
+class UserAdmin(admin.ModelAdmin):
+    list_display = ('id', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count',)
+    readonly_fields = ('recipes_count', 'followers_count',)
+    search_fields = ('username', 'email',)
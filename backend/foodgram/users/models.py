@@ -3,9 +3,10 @@ from django.db import models
 
 
 from posts import validators
+from posts.mixins import DenormalizedFieldsMixin
 
 
-class User(AbstractUser):
+class User(DenormalizedFieldsMixin, AbstractUser):
     email = models.EmailField(
         max_length=254,
         unique=True,
@@ -39,6 +40,18 @@ class User(AbstractUser):
         null=False,
         verbose_name="Пароль",
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Рецептов",
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Подписчиков",
+    )
+
+    denormalized_fields = ("recipes_count", "followers_count")
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ["username", "first_name", "last_name"]
 
@@ -10,9 +10,12 @@ from rest_framework.permissions import (AllowAny,
                                         IsAuthenticated)
 from rest_framework.response import Response
 
-from api.serializers import (UserCreateSerializer, UserSerializer,
-                             SubscribeCreateSerializer)
+from api.batch import batch_add, batch_remove, get_batch_ids
+from api.utils import (annotate_is_subscribed, get_recipes_limit,
+                       get_subscriptions_queryset)
 from posts.models import Subscribe
+from api.serializers import (UserCreateSerializer, UserSerializer,
+                             SubscribeListSerializer)
 
 
 User = get_user_model()
@@ -23,28 +26,26 @@ class UserViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAuthenticatedOrReadOnly,)
     serializer_class = UserSerializer
 
+    def get_queryset(self):
+        return annotate_is_subscribed(super().get_queryset(),
+                                      self.request.user)
+
     def get_permissions(self):
         if self.action == 'me':
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
-    @action(
-        detail=False,
-        permission_classes=(IsAuthenticated,))
-    def subscriptions(self, request):
-        queryset = Subscribe.objects.filter(user=request.user)
-        pages = self.paginate_queryset(queryset)
-        serializer = SubscribeCreateSerializer(
-            pages,
-            many=True,
-            context={'request': request},)
-        return self.get_paginated_response(serializer.data)
-
 
 class AuthViewSet(views.UserViewSet):
 
     permission_classes = [AllowAny]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            return annotate_is_subscribed(queryset, self.request.user)
+        return queryset
+
     def get_permissions(self):
         if self.action == 'login':
             return [AllowAny()]
@@ -74,3 +75,31 @@ class AuthViewSet(views.UserViewSet):
             serializer.user.last_login = now()
         serializer.user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,))
+    def subscriptions(self, request):
+        queryset = get_subscriptions_queryset(
+            request.user, get_recipes_limit(request))
+        pages = self.paginate_queryset(queryset)
+        serializer = SubscribeListSerializer(
+            pages,
+            many=True,
+            context={'request': request},)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=('post', 'delete'),
+        detail=False,
+        url_path='subscribe',
+        permission_classes=(IsAuthenticated,))
+    def subscribe_batch(self, request):
+        """Подписка на нескольких авторов и отписка от них."""
+        ids = get_batch_ids(request)
+        if request.method == 'POST':
+            results, _ = batch_add(request.user, Subscribe, 'author',
+                                   User, ids, rejected={request.user.id})
+        else:
+            results, _ = batch_remove(request.user, Subscribe, 'author', ids)
+        return Response({'results': results})